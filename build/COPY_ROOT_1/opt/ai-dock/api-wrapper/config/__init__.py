@@ -1,58 +1,61 @@
 """
 Configuration module for ComfyUI API wrapper
-"""
 
-from .config import (
-    # ComfyUI API Configuration
-    COMFYUI_API_BASE,
-    COMFYUI_API_PROMPT,
-    COMFYUI_API_QUEUE,
-    COMFYUI_API_HISTORY,
-    COMFYUI_API_INTERRUPT,
-    COMFYUI_API_WEBSOCKET,
-    
-    # Cache Configuration
-    CACHE_TYPE,
-    
-    # Directory Configuration
-    COMFYUI_INSTALL_DIR,
-    INPUT_DIR,
-    OUTPUT_DIR,
-    
-    # S3 Configuration
-    S3_CONFIG,
-    S3_ENABLED,
-    
-    # Webhook Configuration
-    WEBHOOK_CONFIG,
-    WEBHOOK_ENABLED,
-    
-    # Worker Configuration
-    WORKER_CONFIG,
-    
-    # Redis Configuration
-    REDIS_CONFIG,
-    
-    # Debug Configuration
-    DEBUG_ENABLED
-)
+Names are resolved from .config on first access (PEP 562), so importing
+the package only evaluates the settings a caller actually touches.
+"""
 
 __all__ = [
+    # ComfyUI API Configuration
     'COMFYUI_API_BASE',
     'COMFYUI_API_PROMPT',
     'COMFYUI_API_QUEUE',
     'COMFYUI_API_HISTORY',
     'COMFYUI_API_INTERRUPT',
     'COMFYUI_API_WEBSOCKET',
+
+    # Cache Configuration
     'CACHE_TYPE',
+
+    # Request Deduplication
+    'REQUEST_DEDUP_TTL',
+    'WORKFLOW_RESULT_CACHE_TTL',
+
+    # Modifier Configuration
+    'MODIFIER_IO_THREADS',
+    'DOWNLOAD_PRELOAD_HOSTS',
+
+    # Directory Configuration
     'COMFYUI_INSTALL_DIR',
     'INPUT_DIR',
     'OUTPUT_DIR',
+
+    # S3 Configuration
     'S3_CONFIG',
     'S3_ENABLED',
+    'S3_CONCURRENCY',
+
+    # Webhook Configuration
     'WEBHOOK_CONFIG',
     'WEBHOOK_ENABLED',
+    'WEBHOOK_BEFORE_UPLOAD',
+
+    # Worker Configuration
     'WORKER_CONFIG',
+
+    # Redis Configuration
     'REDIS_CONFIG',
-    'DEBUG_ENABLED'
-]
\ No newline at end of file
+
+    # Debug Configuration
+    'DEBUG_ENABLED',
+    'print_config_summary'
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        from . import config as _config
+        value = getattr(_config, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
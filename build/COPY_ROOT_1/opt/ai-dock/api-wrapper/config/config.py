@@ -1,91 +1,373 @@
+import functools
+import json
+import logging
 import os
+import tempfile
+import threading
 from pathlib import Path
-from urllib.parse import urljoin
+from types import MappingProxyType
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Accepted spellings for boolean flags
+_TRUTHY = frozenset({"1", "true", "True", "TRUE", "yes", "on"})
+
+# Load .env file if it exists (before reading environment variables).
+# Container deployments usually inject the environment directly, so only
+# pay for the parse when there is a file to read.
+ENV_FILE_PATH = Path(os.getenv('DOTENV_PATH', '.env'))
+
+# Parsed .env values are cached here, keyed on the file's path, mtime and size.
+# The cache holds the file's secrets, so it lives beside the file (same owner
+# and permissions) rather than in a shared temp directory
+ENV_CACHE_PATH = Path(os.getenv('DOTENV_CACHE_PATH', str(ENV_FILE_PATH.with_name(f"{ENV_FILE_PATH.name}.cache.json"))))
+
+
+# Opt-in stale-while-revalidate: apply the cached values without touching
+# the .env file and check it for changes from a background thread
+ENV_CACHE_SWR = os.getenv('DOTENV_CACHE_SWR') in _TRUTHY
+
+def _read_env_cache():
+    """Return the cached {"key", "values"} record, or None"""
+    try:
+        with open(ENV_CACHE_PATH, 'r', encoding='utf-8') as f:
+            # Ignore caches planted by other users, should the directory be shared
+            if os.fstat(f.fileno()).st_uid != os.getuid():
+                return None
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if isinstance(cached, dict) and isinstance(cached.get("values"), dict):
+        return cached
+    return None
+
+
+def _write_env_cache(key, values):
+    """Atomically rewrite the sidecar cache, ignoring failures"""
+    tmp_path = None
+    try:
+        # mkstemp creates a fresh 0o600 file (O_EXCL), never one someone else prepared
+        fd, tmp_path = tempfile.mkstemp(
+            dir=ENV_CACHE_PATH.parent, prefix=f"{ENV_CACHE_PATH.name}.", suffix=".tmp"
+        )
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({"key": key, "values": values}, f)
+        os.replace(tmp_path, ENV_CACHE_PATH)
+    except OSError:
+        if tmp_path is not None:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+def _env_cache_key(env_path):
+    """Cache key for env_path (path, mtime, size), or None if it cannot be read"""
+    try:
+        stat_result = env_path.stat()
+    except OSError:
+        return None
+    return [os.path.abspath(env_path), stat_result.st_mtime_ns, stat_result.st_size]
+
+
+def _parse_env_file(env_path):
+    """Parse KEY=VALUE lines from env_path, or return None if it cannot be read"""
+    values = {}
+    try:
+        with open(env_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if line.startswith('export '):
+                    line = line[7:]
+                name, sep, value = line.partition('=')
+                name = name.strip()
+                if not sep or not name:
+                    continue
+                value = value.strip()
+                if len(value) > 1 and value[0] in '"\'' and value[-1] == value[0]:
+                    value = value[1:-1]
+                else:
+                    # Unquoted values may carry a trailing " # comment"
+                    value = value.split(' #', 1)[0].rstrip()
+                values[name] = value
+    except OSError:
+        return None
+    return values
+
+
+def _apply_env(values):
+    """Set values without overriding variables already in the environment"""
+    for name, value in values.items():
+        if name not in os.environ:
+            os.environ[name] = value
+
+
+def _load_env_cached(env_path):
+    """Load .env into os.environ, skipping the parser when the cache is fresh
+
+    Returns (loaded, stale) where stale is the cache record to revalidate
+    in the background when the values were served without checking the file.
+    """
+    if ENV_CACHE_SWR:
+        cached = _read_env_cache()
+        key = cached.get("key") if cached else None
+        if isinstance(key, list) and key and key[0] == os.path.abspath(env_path):
+            _apply_env(cached["values"])
+            return True, cached
+
+    key = _env_cache_key(env_path)
+    if key is None:
+        return False, None
+    cached = _read_env_cache()
+    if cached is not None and cached.get("key") == key:
+        values = cached["values"]
+    else:
+        values = _parse_env_file(env_path)
+        if values is None:
+            return False, None
+        _write_env_cache(key, values)
+    _apply_env(values)
+    return True, None
+
+
+def _revalidate_env(env_path, cached):
+    """Check a stale-served cache against the .env file, re-caching it if it changed
+
+    Settings are computed (and imported elsewhere) at startup, so the running
+    process keeps the cached values; only the next start sees the change.
+    """
+    key = _env_cache_key(env_path)
+    if key == cached.get("key"):
+        return
+    if key is not None:
+        values = _parse_env_file(env_path)
+        if values is None:
+            return
+        _write_env_cache(key, values)
+    logger.warning(f"{env_path} changed since its values were cached; restart to apply the change")
+
+
+# Whether settings were loaded from a .env file (saves re-checking the file later)
+_ENV_FILE_LOADED, _stale_env = _load_env_cached(ENV_FILE_PATH)
+
+# Snapshot the environment once; every setting below reads from this dict
+_ENV = dict(os.environ)
+
+
+def _iget(key, default):
+    """Read an integer setting, falling back to default when unset or invalid"""
+    value = _ENV.get(key)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(f"Invalid integer for {key}={value!r}, using default {default}")
+        return default
 
-# Load .env file if it exists (before reading environment variables)
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    # dotenv not installed, continue without it
-    pass
 
 # Base API configuration
-COMFYUI_API_BASE = os.getenv('COMFYUI_API_BASE', 'http://127.0.0.1:8188')
+COMFYUI_API_BASE = _ENV.get('COMFYUI_API_BASE', 'http://127.0.0.1:8188')
 
-# API endpoints
-COMFYUI_API_PROMPT = urljoin(COMFYUI_API_BASE, '/prompt')
-COMFYUI_API_QUEUE = urljoin(COMFYUI_API_BASE, '/queue')
-COMFYUI_API_HISTORY = urljoin(COMFYUI_API_BASE, '/history')
-COMFYUI_API_INTERRUPT = urljoin(COMFYUI_API_BASE, '/api/interrupt')
+# API endpoints (plain concatenation keeps any path prefix on the base URL)
+_base = COMFYUI_API_BASE.rstrip('/')
+COMFYUI_API_PROMPT = f"{_base}/prompt"
+COMFYUI_API_QUEUE = f"{_base}/queue"
+COMFYUI_API_HISTORY = f"{_base}/history"
+COMFYUI_API_INTERRUPT = f"{_base}/api/interrupt"
 
 # WebSocket endpoint (convert http to ws, https to wss)
-COMFYUI_API_WEBSOCKET = COMFYUI_API_BASE.replace('http://', 'ws://').replace('https://', 'wss://') + '/ws'
+if _base.startswith('https://'):
+    COMFYUI_API_WEBSOCKET = f"wss://{_base[8:]}/ws"
+elif _base.startswith('http://'):
+    COMFYUI_API_WEBSOCKET = f"ws://{_base[7:]}/ws"
+else:
+    COMFYUI_API_WEBSOCKET = f"{_base}/ws"
 
 # Cache configuration
-CACHE_TYPE = "redis" if os.getenv("API_CACHE", "").lower() == "redis" else "memory"
-
-# Directory configuration using pathlib
-COMFYUI_INSTALL_DIR = Path(os.getenv('COMFYUI_INSTALL_PATH', '/workspace/ComfyUI'))
-INPUT_DIR = COMFYUI_INSTALL_DIR / 'input'
-OUTPUT_DIR = COMFYUI_INSTALL_DIR / 'output'
-
-# S3 Configuration (fallback from environment)
-S3_CONFIG = {
-    "access_key_id": os.getenv("S3_ACCESS_KEY_ID", ""),
-    "secret_access_key": os.getenv("S3_SECRET_ACCESS_KEY", ""),
-    "endpoint_url": os.getenv("S3_ENDPOINT_URL", ""),
-    "bucket_name": os.getenv("S3_BUCKET_NAME", ""),
-    "region": os.getenv("S3_REGION", ""),
-    "connect_timeout": int(os.getenv("S3_CONNECT_TIMEOUT", "60")),
-    "connect_attempts": int(os.getenv("S3_CONNECT_ATTEMPTS", "3"))
-}
+_cache = _ENV.get("API_CACHE")
+CACHE_TYPE = "redis" if _cache and _cache.casefold() == "redis" else "memory"
+
+# Request deduplication: seconds an identical payload reuses a completed
+# result instead of running again (0 disables)
+REQUEST_DEDUP_TTL = _iget('REQUEST_DEDUP_TTL', 0)
+
+# Seconds a generation worker reuses the ComfyUI result of an identical
+# workflow instead of submitting it again (0 disables)
+WORKFLOW_RESULT_CACHE_TTL = _iget('WORKFLOW_RESULT_CACHE_TTL', 0)
+
+# Threads for the blocking file I/O done while preparing workflow inputs
+MODIFIER_IO_THREADS = _iget('MODIFIER_IO_THREADS', 16)
 
-# Check if S3 is configured via environment
-S3_ENABLED = bool(
-    S3_CONFIG["access_key_id"] and 
-    S3_CONFIG["secret_access_key"] and 
-    S3_CONFIG["bucket_name"]
+# Hosts to resolve and connect to at startup, ahead of the first input download
+DOWNLOAD_PRELOAD_HOSTS = tuple(
+    host.strip()
+    for host in _ENV.get('DOWNLOAD_PRELOAD_HOSTS', 'raw.githubusercontent.com,huggingface.co').split(',')
+    if host.strip()
 )
 
-# Webhook Configuration (fallback from environment)
-WEBHOOK_CONFIG = {
-    "url": os.getenv("WEBHOOK_URL", ""),
-    "timeout": int(os.getenv("WEBHOOK_TIMEOUT", "30"))
-}
+# Files each postprocess worker uploads to S3 at once
+S3_CONCURRENCY = _iget('S3_CONCURRENCY', 16)
 
-# Check if webhook is configured via environment
-WEBHOOK_ENABLED = bool(WEBHOOK_CONFIG["url"])
+# Also send an "uploading" webhook, without URLs, while outputs upload to S3
+WEBHOOK_BEFORE_UPLOAD = _ENV.get('WEBHOOK_BEFORE_UPLOAD') in _TRUTHY
 
-# Worker Configuration
-WORKER_CONFIG = {
-    "preprocess_workers": int(os.getenv("PREPROCESS_WORKERS", "2")),
-    "generation_workers": int(os.getenv("GENERATION_WORKERS", "1")),
-    "postprocess_workers": int(os.getenv("POSTPROCESS_WORKERS", "2")),
-    "max_queue_size": int(os.getenv("MAX_QUEUE_SIZE", "100"))
-}
+# Directory configuration (plain strings; consumers wrap in Path as needed)
+_install = _ENV.get('COMFYUI_INSTALL_PATH', '/workspace/ComfyUI')
+COMFYUI_INSTALL_DIR = _install
+INPUT_DIR = f"{_install}/input"
+OUTPUT_DIR = f"{_install}/output"
+
+
+class WebhookConfig(NamedTuple):
+    url: str
+    timeout: int
 
-# Redis Configuration (if using Redis cache)
-REDIS_CONFIG = {
-    "host": os.getenv("REDIS_HOST", "localhost"),
-    "port": int(os.getenv("REDIS_PORT", "6379")),
-    "db": int(os.getenv("REDIS_DB", "0")),
-    "password": os.getenv("REDIS_PASSWORD", ""),
-    "decode_responses": True
+
+class WorkerConfig(NamedTuple):
+    preprocess_workers: int
+    generation_workers: int
+    postprocess_workers: int
+    max_queue_size: int
+
+
+class RedisConfig(NamedTuple):
+    host: str
+    port: int
+    db: int
+    password: str
+    decode_responses: bool
+
+
+# Settings tables: (field name, environment variable, default).
+# Fields with an int default are parsed as integers.
+_S3_FIELDS = (
+    ("access_key_id", "S3_ACCESS_KEY_ID", ""),
+    ("secret_access_key", "S3_SECRET_ACCESS_KEY", ""),
+    ("endpoint_url", "S3_ENDPOINT_URL", ""),
+    ("bucket_name", "S3_BUCKET_NAME", ""),
+    ("region", "S3_REGION", ""),
+    ("connect_timeout", "S3_CONNECT_TIMEOUT", 60),
+    ("connect_attempts", "S3_CONNECT_ATTEMPTS", 3),
+    ("max_pool_connections", "S3_MAX_POOL_CONNECTIONS", 32),
+)
+
+_WEBHOOK_FIELDS = (
+    ("url", "WEBHOOK_URL", ""),
+    ("timeout", "WEBHOOK_TIMEOUT", 30),
+)
+
+_WORKER_FIELDS = (
+    ("preprocess_workers", "PREPROCESS_WORKERS", 2),
+    ("generation_workers", "GENERATION_WORKERS", 1),
+    ("postprocess_workers", "POSTPROCESS_WORKERS", 2),
+    ("max_queue_size", "MAX_QUEUE_SIZE", 100),
+)
+
+_REDIS_FIELDS = (
+    ("host", "REDIS_HOST", "localhost"),
+    ("port", "REDIS_PORT", 6379),
+    ("db", "REDIS_DB", 0),
+    ("password", "REDIS_PASSWORD", ""),
+)
+
+
+def _read_fields(fields):
+    """Resolve a settings table against the environment snapshot"""
+    return {
+        name: _iget(key, default) if isinstance(default, int) else _ENV.get(key, default)
+        for name, key, default in fields
+    }
+
+
+# Subsystem configuration is resolved on first access only, so importing
+# this module does not pay for S3/webhook/Redis settings that go unused.
+
+@functools.cache
+def s3_config():
+    """S3 Configuration (fallback from environment)"""
+    # Read-only mapping: shares the dict API of payload-supplied S3 configs
+    return MappingProxyType(_read_fields(_S3_FIELDS))
+
+
+@functools.cache
+def s3_enabled():
+    """Check if S3 is configured via environment"""
+    # Short-circuits on the first missing credential without building s3_config()
+    return bool(
+        _ENV.get("S3_ACCESS_KEY_ID") and
+        _ENV.get("S3_SECRET_ACCESS_KEY") and
+        _ENV.get("S3_BUCKET_NAME")
+    )
+
+
+@functools.cache
+def webhook_config():
+    """Webhook Configuration (fallback from environment)"""
+    return WebhookConfig(**_read_fields(_WEBHOOK_FIELDS))
+
+
+@functools.cache
+def webhook_enabled():
+    """Check if webhook is configured via environment"""
+    return bool(_ENV.get("WEBHOOK_URL"))
+
+
+@functools.cache
+def worker_config():
+    """Worker Configuration"""
+    return WorkerConfig(**_read_fields(_WORKER_FIELDS))
+
+
+@functools.cache
+def redis_config():
+    """Redis Configuration (if using Redis cache)"""
+    return RedisConfig(**_read_fields(_REDIS_FIELDS), decode_responses=True)
+
+
+# Module attributes backed by the lazy accessors above (PEP 562)
+_LAZY_ATTRIBUTES = {
+    "S3_CONFIG": s3_config,
+    "S3_ENABLED": s3_enabled,
+    "WEBHOOK_CONFIG": webhook_config,
+    "WEBHOOK_ENABLED": webhook_enabled,
+    "WORKER_CONFIG": worker_config,
+    "REDIS_CONFIG": redis_config,
 }
 
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = _LAZY_ATTRIBUTES[name]()
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if _stale_env is not None:
+    # Only stats and parses the file off the startup path; never touches the environment
+    threading.Thread(target=_revalidate_env, args=(ENV_FILE_PATH, _stale_env), daemon=True).start()
+
+
 # Development/Debug Configuration (actually used for debug output)
-DEBUG_ENABLED = os.getenv("DEBUG", "false").lower() == "true"
+DEBUG_ENABLED = _ENV.get("DEBUG") in _TRUTHY
+
 
-# Print configuration summary if debug enabled
-if DEBUG_ENABLED:
+def print_config_summary():
+    """Print configuration summary if debug enabled"""
+    if not DEBUG_ENABLED:
+        return
+    workers = worker_config()
     print("🔧 Configuration Summary:")
     print(f"   ComfyUI API: {COMFYUI_API_BASE}")
     print(f"   Cache Type: {CACHE_TYPE}")
-    print(f"   Workers: {WORKER_CONFIG['preprocess_workers']}/{WORKER_CONFIG['generation_workers']}/{WORKER_CONFIG['postprocess_workers']}")
-    print(f"   S3 Enabled: {S3_ENABLED}")
-    print(f"   Webhook Enabled: {WEBHOOK_ENABLED}")
-    if os.path.exists('.env'):
+    print(f"   Workers: {workers.preprocess_workers}/{workers.generation_workers}/{workers.postprocess_workers}")
+    print(f"   S3 Enabled: {s3_enabled()}")
+    print(f"   Webhook Enabled: {webhook_enabled()}")
+    if _ENV_FILE_LOADED:
         print("   📄 .env file loaded")
     else:
-        print("   📄 No .env file found")
\ No newline at end of file
+        print("   📄 No .env file found")
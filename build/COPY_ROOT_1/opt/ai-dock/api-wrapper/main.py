@@ -1,28 +1,37 @@
 import asyncio
+import functools
+import hashlib
 import uuid
 import logging
-import json
-from typing import Annotated, List
+from typing import Annotated, AsyncIterator, Dict, List, Tuple
 from datetime import datetime
 from pathlib import Path
 
 from fastapi import FastAPI, Response, Body, Query, Request
-from fastapi.responses import Response, StreamingResponse, HTMLResponse, JSONResponse
+from fastapi.responses import Response, StreamingResponse, HTMLResponse
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 
 from contextlib import asynccontextmanager
 from anyio import create_task_group
 
-from aiocache import Cache, SimpleMemoryCache
+from aiocache import SimpleMemoryCache
+from pydantic import BaseModel
 import time
-import aiofiles
+import cmarkgfm
+import orjson
 
-from config import CACHE_TYPE, WORKER_CONFIG, DEBUG_ENABLED
+from config import CACHE_TYPE, DOWNLOAD_PRELOAD_HOSTS, REDIS_CONFIG, REQUEST_DEDUP_TTL, WORKER_CONFIG, DEBUG_ENABLED, print_config_summary
+from modifiers.basemodifier import close_download_session, warm_up_downloads
 from requestmodels.models import Payload
 from responses.result import Result
+from stores.batched_store import BatchedStore
+from stores.change_feed import RedisChangeFeed
+from stores.layered_cache import LayeredCache
+from stores.redis_store import PickleRedisStore, RedisStore, connect_redis
 from workers.preprocess_worker import PreprocessWorker
 from workers.generation_worker import GenerationWorker
 from workers.postprocess_worker import PostprocessWorker
+from workers.tracked_queue import TrackedQueue
 
 # Configure logging
 logging.basicConfig(level=(logging.DEBUG if DEBUG_ENABLED else logging.INFO))
@@ -46,8 +55,8 @@ async def add_reverse_proxy_headers(request: Request, call_next):
         # or return a dummy JSONResponse to prevent noisy tracebacks.
         raise
 
-    if "location" in response.headers:
-        location = response.headers["location"]
+    location = response.headers.get("location")
+    if location is not None:
         # If it's a redirect to the same path, remove it to prevent loops
         if location.endswith("//") or location == str(request.url):
             del response.headers["location"]
@@ -56,22 +65,149 @@ async def add_reverse_proxy_headers(request: Request, call_next):
 
 
 # Cache configuration - no changes needed, workers handle progress tracking
+# Both modes expose the same aiocache-style get/set/delete/multi_get API
 if CACHE_TYPE == "redis":
-    request_store = Cache(Cache.REDIS, namespace="request_store")
-    response_store = Cache(Cache.REDIS, namespace="response_store")
+    redis_client = connect_redis(REDIS_CONFIG)
+    # Preprocessed payloads carry both modifier and workflow_json, which Input's
+    # validator rejects, so requests are pickled rather than re-validated
+    request_store = PickleRedisStore(redis_client, "request_store")
+    # Results are read on every status check; serve repeats from a local L1
+    # and coalesce the misses from concurrent readers into a single MGET
+    response_store = LayeredCache(BatchedStore(RedisStore(redis_client, "response_store", model=Result)))
+    # Other processes sharing the store announce their writes over pub/sub
+    change_feed = RedisChangeFeed(REDIS_CONFIG)
+    dedup_store = RedisStore(redis_client, "dedup_store")
 else:
     request_store = SimpleMemoryCache(namespace="request_store")
     response_store = SimpleMemoryCache(namespace="response_store")
+    change_feed = None
+    dedup_store = SimpleMemoryCache(namespace="dedup_store")
+
+# Processing queues (defined outside cache logic); they share a position
+# index so status checks can locate a request without scanning the queues
+position_index: Dict[str, Tuple[str, int]] = {}
+# New requests are rejected with 503 once MAX_QUEUE_SIZE are waiting for preprocessing
+preprocess_queue = TrackedQueue("preprocessing", position_index, maxsize=WORKER_CONFIG.max_queue_size)
+# Later stages hold only a couple of requests per worker; when they lag, the
+# upstream worker's put waits, so backlog (and its results) builds up front
+generation_queue = TrackedQueue("generation", position_index, maxsize=max(1, WORKER_CONFIG.generation_workers * 2))
+postprocess_queue = TrackedQueue("postprocessing", position_index, maxsize=max(1, WORKER_CONFIG.postprocess_workers * 2))
+queues_by_name = {queue.name: queue for queue in (preprocess_queue, generation_queue, postprocess_queue)}
+
+# Queue sizes sampled by stats_pump(); shared by every status consumer
+STATS_INTERVAL = 0.2
+current_stats = {
+    "preprocess_queue_size": 0,
+    "generation_queue_size": 0,
+    "postprocess_queue_size": 0,
+}
+
+# Shared heartbeat: every open stream re-checks its queue position on the same tick
+HEARTBEAT_INTERVAL = 1.0
+tick_event = asyncio.Event()
+
+# Rough per-job estimates (seconds) for the queue position wait time
+ESTIMATED_JOB_SECONDS = {
+    "preprocessing": 30,
+    "generation": 120,
+    "postprocessing": 20,
+}
+
+# Per-request change notifications: workers call notify() after every
+# response_store update, so waiting endpoints wake up instead of polling
+notifiers: Dict[str, asyncio.Event] = {}
+
+# Fallback re-check for waiters in case a change notification is lost
+# (e.g. while the Redis subscriber is reconnecting)
+NOTIFY_FALLBACK_INTERVAL = 5.0
+
+
+# Cancellation signals for jobs being generated in this process: the
+# generation worker adds an event when it picks a job up, and every path that
+# marks a request cancelled sets it, so the worker never polls the store
+cancel_events: Dict[str, asyncio.Event] = {}
+
+
+def notify(request_id: str):
+    """Signal that request_id was updated in response_store"""
+    _wake(request_id)
+    if change_feed is not None:
+        change_feed.publish(request_id)
+
+
+def _on_remote_change(request_id: str):
+    """Handle an update made by another process sharing the Redis store"""
+    response_store.forget(request_id)
+    _wake(request_id)
+    if request_id in cancel_events:
+        asyncio.ensure_future(_check_remote_cancel(request_id))
+
+
+def _signal_cancel(request_id: str):
+    """Stop the local generation worker running request_id, if any"""
+    event = cancel_events.get(request_id)
+    if event is not None:
+        event.set()
+
+
+async def _check_remote_cancel(request_id: str):
+    """Forward a cancellation made by another process to the job running here"""
+    try:
+        result = await response_store.get(request_id)
+        if result and result.status == "cancelled":
+            _signal_cancel(request_id)
+    except Exception as e:
+        logger.warning(f"Failed to check remote cancellation of {request_id}: {e}")
+
 
-# Processing queues (defined outside cache logic)
-preprocess_queue = asyncio.Queue()    
-generation_queue = asyncio.Queue()
-postprocess_queue = asyncio.Queue()
+def _wake(request_id: str):
+    """Wake everything waiting on request_id and arm a fresh event for the next update"""
+    event = notifiers.get(request_id)
+    if event is not None:
+        notifiers[request_id] = asyncio.Event()
+        event.set()
+
+
+def _watch(request_id: str) -> asyncio.Event:
+    """Event that is set on the next update of request_id"""
+    event = notifiers.get(request_id)
+    if event is None:
+        event = notifiers[request_id] = asyncio.Event()
+    return event
+
+
+async def _wait_for_update_or_tick(event: asyncio.Event):
+    """Wait until event is set or the next heartbeat tick"""
+    waiters = [asyncio.ensure_future(event.wait()), asyncio.ensure_future(tick_event.wait())]
+    try:
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
+
+
+async def _wait_for_update(event: asyncio.Event, timeout: float):
+    """Wait until event is set or timeout elapses"""
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize workers on startup"""
+    print_config_summary()
+
+    # Render the documentation page up front
+    try:
+        _render_readme(README_PATH.stat().st_mtime_ns)
+    except OSError:
+        pass
+
+    # Resolve and connect to common input hosts without delaying startup
+    asyncio.create_task(warm_up_downloads(DOWNLOAD_PRELOAD_HOSTS))
+
     try:
         asyncio.create_task(main())
         logger.info("Workers initialized successfully")
@@ -80,6 +216,12 @@ async def startup_event():
         raise
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release shared connections"""
+    await close_download_session()
+
+
 async def main():
     """Initialize and start all worker tasks"""
     worker_config = {
@@ -88,53 +230,60 @@ async def main():
         "postprocess_queue": postprocess_queue,
         "request_store": request_store,
         "response_store": response_store,
+        "notify": notify,
+        "cancel_events": cancel_events,
     }
 
     # Create workers using configuration
-    preprocess_workers = [PreprocessWorker(i, worker_config) for i in range(1, WORKER_CONFIG["preprocess_workers"] + 1)]
+    preprocess_workers = [PreprocessWorker(i, worker_config) for i in range(1, WORKER_CONFIG.preprocess_workers + 1)]
     preprocess_tasks = [asyncio.create_task(worker.work()) for worker in preprocess_workers]
 
     # Generation workers from configuration
-    generation_workers = [GenerationWorker(i, worker_config) for i in range(1, WORKER_CONFIG["generation_workers"] + 1)]
+    generation_workers = [GenerationWorker(i, worker_config) for i in range(1, WORKER_CONFIG.generation_workers + 1)]
     generation_tasks = [asyncio.create_task(worker.work()) for worker in generation_workers]
 
-    postprocess_workers = [PostprocessWorker(i, worker_config) for i in range(1, WORKER_CONFIG["postprocess_workers"] + 1)]
+    postprocess_workers = [PostprocessWorker(i, worker_config) for i in range(1, WORKER_CONFIG.postprocess_workers + 1)]
     postprocess_tasks = [asyncio.create_task(worker.work()) for worker in postprocess_workers]
 
     logger.info(f"Started {len(preprocess_workers)} preprocess workers")
     logger.info(f"Started {len(generation_workers)} generation workers")
     logger.info(f"Started {len(postprocess_workers)} postprocess workers")
 
+    stats_task = asyncio.create_task(stats_pump())
+    heartbeat_task = asyncio.create_task(heartbeat())
+    background_tasks = [stats_task, heartbeat_task]
+    if change_feed is not None:
+        background_tasks.append(asyncio.create_task(change_feed.listen(_on_remote_change)))
+
     # Wait indefinitely
     try:
-        await asyncio.gather(*preprocess_tasks, *generation_tasks, *postprocess_tasks)
+        await asyncio.gather(*preprocess_tasks, *generation_tasks, *postprocess_tasks, *background_tasks)
     except Exception as e:
         logger.error(f"Worker task failed: {e}")
         raise
 
 
+async def stats_pump():
+    """Refresh current_stats a few times per second for all readers"""
+    while True:
+        current_stats["preprocess_queue_size"] = preprocess_queue.qsize()
+        current_stats["generation_queue_size"] = generation_queue.qsize()
+        current_stats["postprocess_queue_size"] = postprocess_queue.qsize()
+        await asyncio.sleep(STATS_INTERVAL)
+
+
+async def heartbeat():
+    """Wake every waiting stream once per HEARTBEAT_INTERVAL"""
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        tick_event.set()
+        tick_event.clear()
+
+
 # ===== DOCUMENTATION ENDPOINT =====
-@app.get('/', response_class=HTMLResponse, include_in_schema=False)
-async def documentation():
-    """Serve the API documentation from README.md"""
-    try:
-        readme_path = Path("README.md")
-        if not readme_path.exists():
-            return """
-            <html><body>
-            <h1>ComfyUI API Wrapper</h1>
-            <p>README.md not found. Please ensure README.md exists in the project root.</p>
-            <p><a href="/docs">View Interactive API Documentation</a></p>
-            </body></html>
-            """
-        
-        async with aiofiles.open(readme_path, 'r', encoding='utf-8') as f:
-            markdown_content = await f.read()
-        
-        # Convert markdown to HTML
-        html_content = markdown_to_html(markdown_content)
-        
-        return f"""
+README_PATH = Path("README.md")
+
+DOC_PAGE_TEMPLATE = """
         <!DOCTYPE html>
         <html>
         <head>
@@ -199,7 +348,26 @@ async def documentation():
         </body>
         </html>
         """
+
+
+@app.get('/', response_class=HTMLResponse, include_in_schema=False)
+async def documentation(request: Request):
+    """Serve the API documentation from README.md"""
+    try:
+        # Pre-encoded page, re-rendered only when README.md changes
+        page, etag = _render_readme(README_PATH.stat().st_mtime_ns)
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(content=page, media_type="text/html", headers={"ETag": etag})
         
+    except FileNotFoundError:
+        return """
+        <html><body>
+        <h1>ComfyUI API Wrapper</h1>
+        <p>README.md not found. Please ensure README.md exists in the project root.</p>
+        <p><a href="/docs">View Interactive API Documentation</a></p>
+        </body></html>
+        """
     except Exception as e:
         logger.error(f"Error serving documentation: {e}")
         return f"""
@@ -211,105 +379,13 @@ async def documentation():
         """
 
 
-def markdown_to_html(markdown_text: str) -> str:
-    """Simple markdown to HTML converter for basic formatting"""
-    lines = markdown_text.split('\n')
-    html_lines = []
-    in_code_block = False
-    in_table = False
-    
-    for line in lines:
-        # Handle code blocks
-        if line.strip().startswith('```'):
-            if in_code_block:
-                html_lines.append('</pre>')
-                in_code_block = False
-            else:
-                language = line.strip()[3:].strip()
-                html_lines.append(f'<pre><code class="{language}">')
-                in_code_block = True
-            continue
-        
-        if in_code_block:
-            html_lines.append(line)
-            continue
-        
-        # Handle headers
-        if line.startswith('#### '):
-            html_lines.append(f'<h4>{line[5:]}</h4>')
-        elif line.startswith('### '):
-            html_lines.append(f'<h3>{line[4:]}</h3>')
-        elif line.startswith('## '):
-            html_lines.append(f'<h2>{line[3:]}</h2>')
-        elif line.startswith('# '):
-            html_lines.append(f'<h1>{line[2:]}</h1>')
-        
-        # Handle tables
-        elif '|' in line and line.strip():
-            if not in_table:
-                html_lines.append('<table>')
-                in_table = True
-            
-            if line.strip().startswith('|') and '---' in line:
-                continue  # Skip separator line
-            
-            cells = [cell.strip() for cell in line.split('|')[1:-1]]
-            if cells:
-                # Check if this is likely a header row (first table row)
-                is_header = not any('</table>' in hl for hl in html_lines[-5:])
-                tag = 'th' if is_header and len([l for l in html_lines if '<tr>' in l]) == 0 else 'td'
-                
-                row_html = '<tr>' + ''.join(f'<{tag}>{cell}</{tag}>' for cell in cells) + '</tr>'
-                html_lines.append(row_html)
-        
-        # Handle lists
-        elif line.strip().startswith('- '):
-            if not html_lines or not html_lines[-1].startswith('<li>'):
-                html_lines.append('<ul>')
-            html_lines.append(f'<li>{line.strip()[2:]}</li>')
-            
-        elif line.strip().startswith('* '):
-            if not html_lines or not html_lines[-1].startswith('<li>'):
-                html_lines.append('<ul>')
-            html_lines.append(f'<li>{line.strip()[2:]}</li>')
-        
-        # Handle paragraphs and empty lines
-        elif line.strip() == '':
-            if in_table:
-                html_lines.append('</table>')
-                in_table = False
-            elif html_lines and html_lines[-1].startswith('<li>'):
-                html_lines.append('</ul>')
-            html_lines.append('<br>')
-            
-        else:
-            # Regular paragraph
-            if in_table:
-                html_lines.append('</table>')
-                in_table = False
-            elif html_lines and html_lines[-1].startswith('<li>'):
-                html_lines.append('</ul>')
-            
-            # Handle inline formatting
-            formatted_line = line
-            # Bold
-            formatted_line = formatted_line.replace('**', '<strong>', 1).replace('**', '</strong>', 1)
-            # Italic  
-            formatted_line = formatted_line.replace('*', '<em>', 1).replace('*', '</em>', 1)
-            # Code
-            formatted_line = formatted_line.replace('`', '<code>', 1).replace('`', '</code>', 1)
-            
-            html_lines.append(f'<p>{formatted_line}</p>')
-    
-    # Close any open elements
-    if in_code_block:
-        html_lines.append('</pre>')
-    if in_table:
-        html_lines.append('</table>')
-    if html_lines and html_lines[-1].startswith('<li>'):
-        html_lines.append('</ul>')
-    
-    return '\n'.join(html_lines)
+@functools.lru_cache(maxsize=1)
+def _render_readme(mtime_ns: int) -> Tuple[bytes, str]:
+    """Render README.md into the encoded page and its ETag; cached until the file's mtime changes"""
+    markdown_content = README_PATH.read_text(encoding='utf-8')
+    html_content = cmarkgfm.github_flavored_markdown_to_html(markdown_content)
+    page = DOC_PAGE_TEMPLATE.format(html_content=html_content).encode('utf-8')
+    return page, f'"{hashlib.md5(page).hexdigest()}"'
 
 
 # ===== ASYNC ENDPOINT (renamed from /payload) =====
@@ -331,10 +407,16 @@ async def generate(
     result_pending = Result(id=request_id)
 
     try:
+        duplicate = await _reuse_duplicate(request_id, payload)
+        if duplicate:
+            return duplicate
+
         # Store request and initial result
         await request_store.set(request_id, payload)
         await response_store.set(request_id, result_pending)
-        await preprocess_queue.put(request_id)
+        if not await _enqueue(request_id):
+            response.status_code = 503  # Service Unavailable
+            return _overloaded_result(request_id)
         
         logger.info(f"Queued request {request_id}")
         response.status_code = 202
@@ -361,7 +443,8 @@ async def cancel_on_disconnect(request: Request, request_id: str):
                     if message["type"] == "http.disconnect":
                         client = f'{request.client.host}:{request.client.port}' if request.client else '-:-'
                         logger.info(f'{client} - "{request.method} {request.url.path}" 499 DISCONNECTED for {request_id}')
-                        await _mark_request_cancelled(request_id)
+                        # Shielded so the store write completes even if the scope is torn down
+                        await asyncio.shield(_mark_request_cancelled(request_id))
                         tg.cancel_scope.cancel()
                         break
             except asyncio.CancelledError:
@@ -389,31 +472,41 @@ async def generate_sync(
         payload.input.request_id = str(uuid.uuid4())
     request_id = payload.input.request_id
 
+    duplicate = await _reuse_duplicate(request_id, payload)
+    if duplicate:
+        return _result_response(duplicate)
+
     result_pending = Result(id=request_id)
     await request_store.set(request_id, payload)
     await response_store.set(request_id, result_pending)
-    await preprocess_queue.put(request_id)
+    if not await _enqueue(request_id):
+        response.status_code = 503  # Service Unavailable
+        return _overloaded_result(request_id)
 
     logger.info(f"Queued synchronous request {request_id}")
 
     try:
         async with cancel_on_disconnect(request, request_id):
             while True:
+                # Arm before reading so an update during the read is not missed
+                event = _watch(request_id)
                 result = await response_store.get(request_id)
                 if result and result.status in ["completed", "failed", "timeout", "cancelled"]:
-                    return result
-                await asyncio.sleep(0.5)
+                    return _result_response(result)
+                await _wait_for_update(event, NOTIFY_FALLBACK_INTERVAL)
 
     except asyncio.CancelledError:
         # Clean return instead of exception bubble
-        return JSONResponse(
-            status_code=499,
-            content=Result(
+        return _result_response(
+            Result(
                 id=request_id,
                 status="cancelled",
                 message="Client closed connection"
-            ).__dict__,
+            ),
+            status_code=499,
         )
+    finally:
+        notifiers.pop(request_id, None)
 
 # ===== STREAMING ENDPOINT =====
 @app.post('/generate/stream')
@@ -433,10 +526,13 @@ async def generate_stream(
     result_pending = Result(id=request_id)
 
     try:
-        # Store request and initial result
-        await request_store.set(request_id, payload)
-        await response_store.set(request_id, result_pending)
-        await preprocess_queue.put(request_id)
+        # An identical completed payload is streamed straight to its final result
+        if not await _reuse_duplicate(request_id, payload):
+            # Store request and initial result
+            await request_store.set(request_id, payload)
+            await response_store.set(request_id, result_pending)
+            if not await _enqueue(request_id):
+                return _result_response(_overloaded_result(request_id), status_code=503)
         
         logger.info(f"Starting stream for request {request_id}")
         
@@ -458,6 +554,48 @@ async def generate_stream(
 
 # ===== HELPER FUNCTIONS =====
 
+async def _enqueue(request_id: str) -> bool:
+    """Queue a stored request for preprocessing; on overload drop its state and return False"""
+    try:
+        preprocess_queue.put_nowait(request_id)
+        return True
+    except asyncio.QueueFull:
+        logger.warning(f"Preprocess queue full ({preprocess_queue.maxsize}), rejecting request {request_id}")
+        await request_store.delete(request_id)
+        await response_store.delete(request_id)
+        return False
+
+def _payload_hash(payload: Payload) -> str:
+    """Stable digest of a payload, ignoring its request_id"""
+    payload_bytes = orjson.dumps(
+        payload.model_dump(exclude={"input": {"request_id"}}),
+        option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+    )
+    return hashlib.blake2b(payload_bytes, digest_size=16).hexdigest()
+
+async def _reuse_duplicate(request_id: str, payload: Payload):
+    """Copy the completed result of an identical earlier payload, or remember this one"""
+    if not REQUEST_DEDUP_TTL:
+        return None
+    try:
+        key = _payload_hash(payload)
+        previous_id = await dedup_store.get(key)
+        if previous_id:
+            previous = await response_store.get(previous_id)
+            if previous and previous.status == "completed":
+                result = previous.model_copy(update={"id": request_id})
+                await response_store.set(request_id, result)
+                logger.info(f"Request {request_id} duplicates {previous_id}, reusing its result")
+                return result
+        await dedup_store.set(key, request_id, ttl=REQUEST_DEDUP_TTL)
+    except Exception as e:
+        logger.warning(f"Duplicate check failed for {request_id}: {e}")
+    return None
+
+def _overloaded_result(request_id: str) -> Result:
+    """Result returned when the preprocess queue is full"""
+    return Result(id=request_id, status="failed", message="Server overloaded, retry later")
+
 async def _mark_request_cancelled(request_id: str):
     """Helper to mark a request as cancelled in the response store"""
     try:
@@ -468,6 +606,8 @@ async def _mark_request_cancelled(request_id: str):
                 result.status = "cancelled"
                 result.message = "Request cancelled due to client disconnection"
                 await response_store.set(request_id, result)
+                notify(request_id)
+                _signal_cancel(request_id)
                 logger.info(f"Marked request {request_id} as cancelled")
             else:
                 logger.debug(f"Request {request_id} already in terminal state: {result.status}")
@@ -479,82 +619,106 @@ async def _mark_request_cancelled(request_id: str):
                 message="Request cancelled due to client disconnection"
             )
             await response_store.set(request_id, cancelled_result)
+            notify(request_id)
             logger.info(f"Created cancelled result for request {request_id}")
             
     except Exception as e:
         logger.error(f"Failed to mark request {request_id} as cancelled: {e}")
 
-async def _stream_status_updates(request_id: str):
+async def _stream_status_updates(request_id: str) -> AsyncIterator[bytes]:
     """Generator that yields Server-Sent Events for status updates using worker progress"""
     last_result = None
     last_queue_position = None
-    poll_interval = 1.0  # Check for updates every second
-    start_time = time.time()
+    start_time = time.monotonic()
+
+    # Event payload reused across ticks; only the volatile fields change.
+    # queue_info is the shared stats snapshot and is read, never written.
+    event_data = {
+        "request_id": request_id,
+        "status": "queued",
+        "message": "Request queued",
+        "timestamp": "",
+        "elapsed_time": 0.0,
+        "queue_info": current_stats,
+        "queue_position": None
+    }
     
     # Send initial event
-    yield f"data: {json.dumps({'request_id': request_id, 'status': 'queued', 'message': 'Request queued', 'timestamp': datetime.utcnow().isoformat()})}\n\n"
+    yield _sse_frame({'request_id': request_id, 'status': 'queued', 'message': 'Request queued', 'timestamp': datetime.utcnow().isoformat()})
     
-    while True:
-        try:
-            # Get current result from the store (updated by workers)
-            current_result = await response_store.get(request_id)
+    try:
+        while True:
+            try:
+                # Arm before reading so an update during the read is not missed
+                event = _watch(request_id)
+
+                # Get current result from the store (updated by workers)
+                current_result = await response_store.get(request_id)
             
-            # Get current queue position
-            queue_position = _get_queue_position(request_id)
+                # Get current queue position
+                queue_position = _get_queue_position(request_id)
             
-            # Check if result has changed or queue position changed
-            position_changed = queue_position != last_queue_position
-            result_changed = current_result and (not last_result or _result_changed(last_result, current_result))
+                # Check if result has changed or queue position changed
+                position_changed = queue_position != last_queue_position
+                result_changed = current_result and (not last_result or _result_changed(last_result, current_result))
             
-            if result_changed or position_changed:
+                if result_changed or position_changed:
                 
-                # Build event data from the result object
-                event_data = {
-                    "request_id": request_id,
-                    "status": getattr(current_result, 'status', 'unknown') if current_result else 'queued',
-                    "message": getattr(current_result, 'message', '') if current_result else 'Request queued',
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "elapsed_time": round(time.time() - start_time, 1),
-                    "queue_info": {
-                        "preprocess_queue_size": preprocess_queue.qsize(),
-                        "generation_queue_size": generation_queue.qsize(),
-                        "postprocess_queue_size": postprocess_queue.qsize(),
-                    },
-                    "queue_position": queue_position
-                }
+                    # Update event data from the result object
+                    event_data["status"] = getattr(current_result, 'status', 'unknown') if current_result else 'queued'
+                    event_data["message"] = getattr(current_result, 'message', '') if current_result else 'Request queued'
+                    event_data["timestamp"] = datetime.utcnow().isoformat()
+                    event_data["elapsed_time"] = round(time.monotonic() - start_time, 1)
+                    event_data["queue_position"] = queue_position
                 
-                # Add output info if available
-                if current_result and hasattr(current_result, 'output') and current_result.output:
-                    event_data["output_count"] = len(current_result.output)
+                    # Add output info if available
+                    if current_result and hasattr(current_result, 'output') and current_result.output:
+                        event_data["output_count"] = len(current_result.output)
+                    else:
+                        event_data.pop("output_count", None)
                 
-                yield f"data: {json.dumps(event_data)}\n\n"
-                last_result = current_result
-                last_queue_position = queue_position
+                    yield _sse_frame(event_data)
+                    last_result = current_result
+                    last_queue_position = queue_position
             
-            # Check if processing is complete
-            if current_result and hasattr(current_result, 'status'):
-                if current_result.status in ['completed', 'failed', 'timeout']:
-                    # Send final result
-                    final_data = {
-                        "request_id": request_id,
-                        "status": "final_result",
-                        "result": _serialize_result(current_result),
-                        "elapsed_time": round(time.time() - start_time, 1)
-                    }
-                    yield f"data: {json.dumps(final_data)}\n\n"
-                    break
+                # Check if processing is complete
+                if current_result and hasattr(current_result, 'status'):
+                    if current_result.status in ['completed', 'failed', 'timeout']:
+                        # Send final result
+                        final_data = {
+                            "request_id": request_id,
+                            "status": "final_result",
+                            "result": _result_fragment(current_result),
+                            "elapsed_time": round(time.monotonic() - start_time, 1)
+                        }
+                        yield _sse_frame(final_data)
+                        break
             
-            await asyncio.sleep(poll_interval)
+                # Wake on the next worker update; queue positions move without
+                # store writes, so still re-check them on the shared heartbeat
+                await _wait_for_update_or_tick(event)
             
-        except Exception as e:
-            error_data = {
-                "request_id": request_id,
-                "status": "error",
-                "message": f"Stream error: {str(e)}",
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            yield f"data: {json.dumps(error_data)}\n\n"
-            break
+            except Exception as e:
+                error_data = {
+                    "request_id": request_id,
+                    "status": "error",
+                    "message": f"Stream error: {str(e)}",
+                    "timestamp": datetime.utcnow().isoformat()
+                }
+                yield _sse_frame(error_data)
+                break
+    finally:
+        notifiers.pop(request_id, None)
+
+
+# Server-Sent Events framing, kept as bytes so frames go out without re-encoding
+DATA_PREFIX = b"data: "
+FRAME_SUFFIX = b"\n\n"
+
+
+def _sse_frame(obj) -> bytes:
+    """Encode obj as a single SSE data frame"""
+    return DATA_PREFIX + orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS) + FRAME_SUFFIX
 
 
 def _get_queue_position(request_id: str) -> dict:
@@ -567,39 +731,16 @@ def _get_queue_position(request_id: str) -> dict:
     }
     
     try:
-        # Check preprocess queue
-        preprocess_items = list(preprocess_queue._queue)
-        if request_id in preprocess_items:
-            position = preprocess_items.index(request_id) + 1  # 1-based position
-            position_info.update({
-                "current_queue": "preprocessing",
-                "position": position,
-                "queue_size": len(preprocess_items),
-                "estimated_wait_time": position * 30  # Rough estimate: 30s per preprocessing job
-            })
-            return position_info
-        
-        # Check generation queue
-        generation_items = list(generation_queue._queue)
-        if request_id in generation_items:
-            position = generation_items.index(request_id) + 1
+        entry = position_index.get(request_id)
+        if entry is not None:
+            queue_name, seq = entry
+            queue = queues_by_name[queue_name]
+            position = queue.position(seq)  # 1-based position
             position_info.update({
-                "current_queue": "generation", 
+                "current_queue": queue_name,
                 "position": position,
-                "queue_size": len(generation_items),
-                "estimated_wait_time": position * 120  # Rough estimate: 2min per generation job
-            })
-            return position_info
-        
-        # Check postprocess queue
-        postprocess_items = list(postprocess_queue._queue)
-        if request_id in postprocess_items:
-            position = postprocess_items.index(request_id) + 1
-            position_info.update({
-                "current_queue": "postprocessing",
-                "position": position, 
-                "queue_size": len(postprocess_items),
-                "estimated_wait_time": position * 20  # Rough estimate: 20s per postprocessing job
+                "queue_size": queue.qsize(),
+                "estimated_wait_time": position * ESTIMATED_JOB_SECONDS[queue_name]
             })
             return position_info
         
@@ -637,21 +778,46 @@ def _result_changed(old_result, new_result) -> bool:
     return old_status != new_status or old_message != new_message
 
 
+def _result_response(result: Result, status_code: int = 200) -> Response:
+    """Send a stored Result as JSON without FastAPI validating and re-encoding it"""
+    return Response(content=result.model_dump_json(), status_code=status_code, media_type="application/json")
+
+
+def _result_fragment(result):
+    """Pre-serialized result for embedding in an SSE event"""
+    if isinstance(result, BaseModel):
+        try:
+            return orjson.Fragment(result.model_dump_json())
+        except Exception:
+            pass  # Fall back to coercing unserializable values
+    return _serialize_result(result)
+
+
+_JSON_PRIMITIVES = (str, int, float, bool, type(None))
+
+
+def _coerce(value):
+    """Copy value as JSON-compatible data, converting unknown types with str()"""
+    if isinstance(value, _JSON_PRIMITIVES):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_coerce(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _coerce(item) for key, item in value.items()}
+    return str(value)
+
+
 def _serialize_result(result) -> dict:
     """Convert result object to dictionary for JSON serialization"""
     try:
+        if isinstance(result, BaseModel):
+            try:
+                return result.model_dump(mode="json")
+            except Exception:
+                pass  # Fall back to coercing unserializable values below
         if hasattr(result, '__dict__'):
-            # Get all attributes as dict
-            result_dict = {}
-            for key, value in result.__dict__.items():
-                try:
-                    # Test if value is JSON serializable
-                    json.dumps(value)
-                    result_dict[key] = value
-                except (TypeError, ValueError):
-                    # If not serializable, convert to string
-                    result_dict[key] = str(value)
-            return result_dict
+            # Values that aren't plain JSON types are converted to strings
+            return {key: _coerce(value) for key, value in result.__dict__.items()}
         else:
             return {"data": str(result)}
     except Exception as e:
@@ -659,20 +825,19 @@ def _serialize_result(result) -> dict:
 
 
 @app.get('/result/{request_id}', response_model=Result, status_code=200)
-async def result(request_id: str, response: Response):
+async def result(request_id: str):
     """Get the result of a processing request"""
     try:
         result = await response_store.get(request_id)
         if not result:
             result = Result(id=request_id, status="failed", message="Request ID not found")
-            response.status_code = 404
+            return _result_response(result, status_code=404)
         
-        return result
+        return _result_response(result)
     except Exception as e:
         logger.error(f"Failed to get result for {request_id}: {e}")
         result = Result(id=request_id, status="failed", message="Internal server error")
-        response.status_code = 500
-        return result
+        return _result_response(result, status_code=500)
 
 @app.post('/cancel/{request_id}', status_code=200)
 async def cancel_request_simple(
@@ -699,6 +864,8 @@ async def cancel_request_simple(
         result.status = "cancelled"
         result.message = "Request cancelled by client"
         await response_store.set(request_id, result)
+        notify(request_id)
+        _signal_cancel(request_id)
         
         logger.info(f"Cancelled request {request_id}")
         
@@ -714,11 +881,7 @@ async def cancel_request_simple(
 @app.get('/queue-info', response_model=dict)
 async def queue_info():
     """Get information about current queue sizes"""
-    return {
-        "preprocess_queue_size": preprocess_queue.qsize(),
-        "generation_queue_size": generation_queue.qsize(),
-        "postprocess_queue_size": postprocess_queue.qsize(),
-    }
+    return dict(current_stats)
 
 
 @app.get('/health', response_model=dict)
@@ -728,8 +891,8 @@ async def health():
         "status": "healthy",
         "cache_type": CACHE_TYPE,
         "queues": {
-            "preprocess": preprocess_queue.qsize(),
-            "generation": generation_queue.qsize(), 
-            "postprocess": postprocess_queue.qsize(),
+            "preprocess": current_stats["preprocess_queue_size"],
+            "generation": current_stats["generation_queue_size"],
+            "postprocess": current_stats["postprocess_queue_size"],
         }
     }
\ No newline at end of file
@@ -1,19 +1,138 @@
 import asyncio
-import json
+import functools
 import hashlib
 import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from urllib.parse import urlparse
 
 import aiofiles
 import aiohttp
 import magic
 import mimetypes
+import orjson
+import xxhash
 
-from config import INPUT_DIR
+from config import INPUT_DIR, MODIFIER_IO_THREADS
+from requestmodels.models import URL_PATTERN
 
 logger = logging.getLogger(__name__)
 
+# Download buffering: aiohttp read buffer, streamed chunk size, the largest
+# advertised body that is read in one call instead of streamed, and how much
+# streamed data is gathered before each file write
+DOWNLOAD_READ_BUFSIZE = 10 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 1 << 17
+DOWNLOAD_SINGLE_READ_MAX = 1 << 20
+DOWNLOAD_WRITE_BATCH = 1 << 22
+
+# Suffix of a download still being written; never matched as an input file
+DOWNLOAD_PART_SUFFIX = '.part'
+
+# Bytes of a download handed to libmagic to detect its type
+MIME_SNIFF_BYTES = 4096
+
+# Content-Types that say nothing about the file, so the body is sniffed instead
+GENERIC_CONTENT_TYPES = frozenset({
+    'application/octet-stream',
+    'binary/octet-stream',
+    'application/download',
+    'application/force-download',
+    'application/x-download',
+})
+
+# Extensions downloads are saved with, and so the only ones probed for an
+# already downloaded input, most common first; other types are saved as .bin
+INPUT_FILE_EXTENSIONS = (
+    '.jpg', '.png', '.webp', '.gif', '.jpeg', '.bmp', '.tiff', '.avif', '.heic', '.jxl', '.svg',
+    '.mp4', '.webm', '.mov', '.mkv', '.avi', '.ogv', '.mpeg',
+    '.wav', '.mp3', '.flac', '.m4a', '.oga', '.opus', '.aac',
+    '.json', '.txt', '.bin',
+)
+_INPUT_FILE_EXTENSION_SET = frozenset(INPUT_FILE_EXTENSIONS)
+
+# MIME types the platform's mimetypes tables map to no or an unusual extension
+MIME_EXTENSIONS = {
+    'video/x-matroska': '.mkv',
+    'audio/wav': '.wav',
+    'audio/x-flac': '.flac',
+}
+
+# Recently resolved inputs, (directory, hash) -> Path, shared by all modifiers
+# and touched from executor threads
+_INPUT_FILE_CACHE_SIZE = 1024
+_input_file_cache = OrderedDict()
+_input_file_lock = threading.Lock()
+
+
+# Dedicated pool for disk probes, renames and libmagic, so input handling neither
+# blocks the event loop nor competes with other users of the default executor
+IO_EXECUTOR = ThreadPoolExecutor(max_workers=MODIFIER_IO_THREADS, thread_name_prefix='modifier-io')
+
+
+async def _run_io(func, *args):
+    """Run a blocking filesystem call on the modifier I/O pool"""
+    return await asyncio.get_running_loop().run_in_executor(IO_EXECUTOR, func, *args)
+
+
+def _remember_input_file(directory_path, filename_without_extension, file_path):
+    """Record where the input for a hash lives"""
+    key = (str(directory_path), filename_without_extension)
+    with _input_file_lock:
+        _input_file_cache[key] = file_path
+        _input_file_cache.move_to_end(key)
+        if len(_input_file_cache) > _INPUT_FILE_CACHE_SIZE:
+            _input_file_cache.popitem(last=False)
+
+
+# Download directories already created by this process
+_created_dirs = set()
+
+# Downloads in progress across all modifiers, hash -> task resolving to the Path
+_downloads_in_flight = {}
+
+# One pooled session for all downloads in the process, so DNS answers, keep-alive
+# connections and TLS sessions carry over between workflows
+_download_session = None
+
+
+def get_download_session():
+    """Return the process-wide download session, creating it on first use"""
+    global _download_session
+    if _download_session is None or _download_session.closed:
+        _download_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=32, limit_per_host=8, ttl_dns_cache=300)
+        )
+    return _download_session
+
+
+async def close_download_session():
+    """Close the download session (on shutdown)"""
+    global _download_session
+    if _download_session is not None:
+        await _download_session.close()
+        _download_session = None
+
+
+async def warm_up_downloads(hosts, timeout=5):
+    """Resolve and connect to hosts ahead of the first download from them"""
+    if not hosts:
+        return
+    session = get_download_session()
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async def _touch(host):
+        async with session.head(f"https://{host}/", allow_redirects=False, timeout=client_timeout):
+            pass
+
+    results = await asyncio.gather(*(_touch(host) for host in hosts), return_exceptions=True)
+    for host, result in zip(hosts, results):
+        if isinstance(result, Exception):
+            logger.debug(f"Could not warm up connection to {host}: {result}")
+    logger.info(f"Warmed up download connections to {len(hosts)} hosts")
+
 
 class BaseModifier:
     WORKFLOW_JSON = ""
@@ -21,6 +140,8 @@ class BaseModifier:
     def __init__(self, modifications=None):
         self.modifications = modifications or {}
         self.input_dir = Path(INPUT_DIR)
+        # url -> task resolving to its input filename, so repeats in a workflow are free
+        self._url_to_filename = {}
     
     async def load_workflow(self, workflow=None):
         """Load workflow from file or use provided workflow dict"""
@@ -29,18 +150,18 @@ class BaseModifier:
         else:
             try:
                 workflow_path = Path(self.WORKFLOW_JSON)
-                async with aiofiles.open(workflow_path, 'r') as f:
+                async with aiofiles.open(workflow_path, 'rb', executor=IO_EXECUTOR) as f:
                     file_content = await f.read()
-                    self.workflow = json.loads(file_content)
+                    self.workflow = orjson.loads(file_content)
                 logger.info(f"Loaded workflow from {workflow_path}")
             except FileNotFoundError:
                 raise Exception(f"Workflow file not found: {self.WORKFLOW_JSON}")
-            except json.JSONDecodeError as e:
+            except orjson.JSONDecodeError as e:
                 raise Exception(f"Invalid JSON in workflow file: {e}")
             except Exception as e:
                 raise Exception(f"Could not load workflow: {e}")
         
-    async def modify_workflow_value(self, key, default=None):
+    def modify_workflow_value(self, key, default=None):
         """
         Modify a workflow value after loading the json.
         """
@@ -55,102 +176,189 @@ class BaseModifier:
         """
         Find all URL strings in the prompt and replace the URL string with a filepath
         """
-        if isinstance(data, dict):
-            for key, value in data.items():
-                data[key] = await self.replace_workflow_urls(value)
-        elif isinstance(data, list):
-            for i, item in enumerate(data):
-                data[i] = await self.replace_workflow_urls(item)
-        elif isinstance(data, str) and self.is_url(data):
-            try:
-                data = await self.get_url_content(data)
-            except Exception as e:
-                logger.error(f"Failed to download URL {data}: {e}")
-                raise
+        if isinstance(data, str):
+            return await self.get_url_content(data) if self.is_url(data) else data
+
+        refs = []
+        self._collect_urls(data, refs)
+        if not refs:
+            return data
+
+        # Download each distinct URL once, all of them concurrently
+        urls = list(dict.fromkeys(url for _, _, url in refs))
+        results = await asyncio.gather(
+            *(self.get_url_content(url) for url in urls),
+            return_exceptions=True
+        )
+        filenames = {}
+        for url, result in zip(urls, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Failed to download URL {url}: {result}")
+                raise result
+            filenames[url] = result
+
+        for container, key, url in refs:
+            container[key] = filenames[url]
         return data
+
+    def _collect_urls(self, data, refs):
+        """Append a (container, key, url) ref for every URL string under data"""
+        # Explicit stack rather than recursion, so deeply nested workflows
+        # cannot hit the recursion limit
+        stack = [data]
+        while stack:
+            container = stack.pop()
+            if isinstance(container, dict):
+                items = container.items()
+            elif isinstance(container, list):
+                items = enumerate(container)
+            else:
+                continue
+            for key, value in items:
+                if isinstance(value, str):
+                    if self.is_url(value):
+                        refs.append((container, key, value))
+                elif isinstance(value, (dict, list)):
+                    stack.append(value)
             
     async def get_url_content(self, url):
         """
         Download from URL to ComfyUI input directory as hash.ext to avoid downloading the resource
         multiple times
         """
+        task = self._url_to_filename.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_url_content(url))
+            self._url_to_filename[url] = task
+        return await task
+
+    async def _fetch_url_content(self, url):
+        """Resolve url to an input filename, downloading it if not cached on disk"""
         filename_without_extension = self.get_url_hash(url)
+
+        # A download in progress may already sit under its final name, so join
+        # it rather than probing the disk and finding a partial file
+        download = _downloads_in_flight.get(filename_without_extension)
+        if download is not None:
+            file_path = await asyncio.shield(download)
+            return file_path.name
+
         existing_file = await self.find_input_file(
             self.input_dir,
             filename_without_extension
         )
+        if not existing_file:
+            # Inputs downloaded before the switch to xxh3 are named by MD5
+            existing_file = await self.find_input_file(
+                self.input_dir,
+                self.get_legacy_url_hash(url)
+            )
         if existing_file:
             logger.info(f"Using cached file for {url}: {existing_file.name}")
             return existing_file.name
         else:
-            file_path = await self.download_file(url, self.input_dir)
+            download = _downloads_in_flight.get(filename_without_extension)
+            if download is None:
+                download = asyncio.ensure_future(self.download_file(url, self.input_dir))
+                _downloads_in_flight[filename_without_extension] = download
+                download.add_done_callback(
+                    lambda _: _downloads_in_flight.pop(filename_without_extension, None)
+                )
+            # Shielded: one caller giving up must not abort the download for the rest
+            file_path = await asyncio.shield(download)
             logger.info(f"Downloaded {url} to {file_path.name}")
             return file_path.name
     
     def is_url(self, value):
         """Check if a string is a valid URL"""
-        try:
-            parsed = urlparse(value)
-            return bool(parsed.scheme and parsed.netloc)
-        except Exception:
-            return False
+        return isinstance(value, str) and URL_PATTERN.match(value) is not None
     
     def get_url_hash(self, url):
-        """Generate MD5 hash for URL"""
+        """Generate xxh3 hash for URL"""
+        return xxhash.xxh3_64_hexdigest(url.encode())
+
+    def get_legacy_url_hash(self, url):
+        """Generate the MD5 hash earlier versions named downloads by"""
         return hashlib.md5(url.encode()).hexdigest()
     
     async def download_file(self, url, target_dir):
         """Download file from URL to target directory"""
-        temp_filepath = None
+        write_filepath = None
         try:
             file_name_hash = self.get_url_hash(url)
             target_dir = Path(target_dir)
-            target_dir.mkdir(parents=True, exist_ok=True)
-            
-            temp_filepath = target_dir / file_name_hash
+            if target_dir not in _created_dirs:
+                await _run_io(functools.partial(target_dir.mkdir, parents=True, exist_ok=True))
+                _created_dirs.add(target_dir)
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status >= 400:
-                        raise aiohttp.ClientResponseError(
-                            request_info=response.request_info,
-                            history=response.history,
-                            status=response.status,
-                            message=f"Unable to download {url}"
-                        )
-                    
-                    # Write to temporary file first
-                    async with aiofiles.open(temp_filepath, mode="wb") as file:
-                        async for chunk in response.content.iter_chunked(8192):
-                            await file.write(chunk)
-                    
-                    # Determine file extension and rename
-                    file_extension = await self.get_file_extension(temp_filepath)
-                    final_filepath = target_dir / f"{file_name_hash}{file_extension}"
-                    
-                    # Rename temp file to final name
-                    temp_filepath.rename(final_filepath)
-                    
-                    logger.info(f"Downloaded {url} to {final_filepath}")
-                    return final_filepath
-                    
-        except Exception as e:
-            # Clean up temp file if it exists
-            if temp_filepath and temp_filepath.exists():
-                temp_filepath.unlink()
-            logger.error(f"Failed to download {url}: {e}")
+            async with self._get_session().get(url, read_bufsize=DOWNLOAD_READ_BUFSIZE) as response:
+                if response.status >= 400:
+                    raise aiohttp.ClientResponseError(
+                        request_info=response.request_info,
+                        history=response.history,
+                        status=response.status,
+                        message=f"Unable to download {url}"
+                    )
+                
+                # Trust the server's Content-Type; libmagic is only needed
+                # when it is missing or generic
+                file_extension = self.get_content_type_extension(response)
+                sniff = file_extension is None
+
+                # Written under a temporary name and renamed once complete, so an
+                # interrupted download never sits under the name later requests
+                # (or other processes sharing the directory) look for; the pid
+                # keeps concurrent processes off each other's file. Without a
+                # known type the head of the body is kept to sniff it from
+                write_filepath = target_dir / f"{file_name_hash}{file_extension or ''}.{os.getpid()}{DOWNLOAD_PART_SUFFIX}"
+                head = b""
+                async with aiofiles.open(write_filepath, mode="wb", executor=IO_EXECUTOR) as file:
+                    length = response.content_length
+                    if length is not None and length <= DOWNLOAD_SINGLE_READ_MAX:
+                        body = await response.read()
+                        head = body[:MIME_SNIFF_BYTES]
+                        await file.write(body)
+                    else:
+                        # Coalesce chunks so each trip to the I/O pool writes a batch
+                        pending = bytearray()
+                        async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                            if sniff and len(head) < MIME_SNIFF_BYTES:
+                                head += chunk[:MIME_SNIFF_BYTES - len(head)]
+                            pending += chunk
+                            if len(pending) >= DOWNLOAD_WRITE_BATCH:
+                                await file.write(pending)
+                                pending = bytearray()
+                        if pending:
+                            await file.write(pending)
+                
+                # Determine file extension and rename
+                if sniff:
+                    if head:
+                        file_extension = self.get_buffer_extension(head)
+                    else:
+                        file_extension = await self.get_file_extension(write_filepath)
+                final_filepath = target_dir / f"{file_name_hash}{file_extension}"
+                await _run_io(write_filepath.replace, final_filepath)
+                write_filepath = None
+                _remember_input_file(target_dir, file_name_hash, final_filepath)
+                
+                logger.info(f"Downloaded {url} to {final_filepath}")
+                return final_filepath
+                
+        except BaseException as e:
+            # Clean up the partial file if it exists, on cancellation as well
+            if write_filepath is not None:
+                write_filepath.unlink(missing_ok=True)
+            if isinstance(e, Exception):
+                logger.error(f"Failed to download {url}: {e}")
             raise
     
     async def find_input_file(self, directory, filename_without_extension):
         """Find existing file with given hash prefix"""
         try:
+            # A missing directory just fails every probe, no separate check needed
             directory_path = Path(directory)
-            if not directory_path.exists():
-                return None
-                
-            loop = asyncio.get_running_loop()
-            files = await loop.run_in_executor(
-                None, 
+            files = await _run_io(
                 self.list_files_in_directory, 
                 directory_path, 
                 filename_without_extension
@@ -163,40 +371,73 @@ class BaseModifier:
     
     def list_files_in_directory(self, directory_path, filename_without_extension):
         """List files matching the hash prefix"""
-        files = []
         try:
-            for file_path in directory_path.glob(f"{filename_without_extension}*"):
+            key = (str(directory_path), filename_without_extension)
+            with _input_file_lock:
+                cached = _input_file_cache.get(key)
+            if cached is not None and cached.is_file():
+                return [cached]
+
+            # A few stat() calls instead of scanning the whole input directory;
+            # download_file only ever saves these extensions
+            for extension in INPUT_FILE_EXTENSIONS:
+                file_path = directory_path / f"{filename_without_extension}{extension}"
                 if file_path.is_file():
-                    files.append(file_path)
+                    _remember_input_file(directory_path, filename_without_extension, file_path)
+                    return [file_path]
         except Exception as e:
             logger.error(f"Error listing files in {directory_path}: {e}")
-        return files
+        return []
             
     async def get_file_extension(self, filepath):
         """Determine file extension from MIME type"""
         try:
-            mime_str = magic.from_file(str(filepath), mime=True)
-            extension = mimetypes.guess_extension(mime_str)
-            if not extension:
-                # Fallback based on common image types
-                if 'image' in mime_str:
-                    if 'jpeg' in mime_str:
-                        extension = '.jpg'
-                    elif 'png' in mime_str:
-                        extension = '.png'
-                    elif 'gif' in mime_str:
-                        extension = '.gif'
-                    elif 'webp' in mime_str:
-                        extension = '.webp'
-                    else:
-                        extension = '.jpg'  # Default for images
-                else:
-                    extension = '.bin'  # Generic binary
-            return extension
+            mime_str = await _run_io(functools.partial(magic.from_file, str(filepath), mime=True))
+            return self.mime_to_extension(mime_str)
         except Exception as e:
             logger.warning(f"Could not determine file type for {filepath}: {e}")
             return '.jpg'  # Fallback to a default extension
+
+    def get_content_type_extension(self, response):
+        """Extension for the response's Content-Type, or None if it is missing or generic"""
+        mime_str = response.content_type
+        if not mime_str or mime_str in GENERIC_CONTENT_TYPES:
+            return None
+        return self.mime_to_extension(mime_str)
+
+    def get_buffer_extension(self, buffer):
+        """Determine file extension from the MIME type of the leading bytes"""
+        try:
+            return self.mime_to_extension(magic.from_buffer(buffer, mime=True))
+        except Exception as e:
+            logger.warning(f"Could not determine file type from buffer: {e}")
+            return '.jpg'  # Fallback to a default extension
+
+    def mime_to_extension(self, mime_str):
+        """Map a MIME type to one of INPUT_FILE_EXTENSIONS"""
+        extension = MIME_EXTENSIONS.get(mime_str) or mimetypes.guess_extension(mime_str)
+        if extension not in _INPUT_FILE_EXTENSION_SET:
+            # Unknown, or an extension find_input_file would not probe for;
+            # fallback based on common image types
+            if 'image' in mime_str:
+                if 'jpeg' in mime_str:
+                    extension = '.jpg'
+                elif 'png' in mime_str:
+                    extension = '.png'
+                elif 'gif' in mime_str:
+                    extension = '.gif'
+                elif 'webp' in mime_str:
+                    extension = '.webp'
+                else:
+                    extension = '.jpg'  # Default for images
+            else:
+                extension = '.bin'  # Generic binary
+        return extension
           
+    def _get_session(self):
+        """HTTP session shared by every download"""
+        return get_download_session()
+
     async def apply_modifications(self):
         """Apply all modifications to the workflow"""
         await self.replace_workflow_urls(self.workflow)
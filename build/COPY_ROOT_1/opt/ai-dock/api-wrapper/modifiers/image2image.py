@@ -19,32 +19,39 @@ class Image2Image(BaseModifier):
 
     async def apply_modifications(self):
         timestr = time.strftime("%Y%m%d-%H%M%S")
-        self.workflow["3"]["inputs"]["seed"] = await self.modify_workflow_value(
+        # Resolve each node once; every modification below writes into these
+        sampler = self.workflow["3"]["inputs"]
+        positive = self.workflow["6"]["inputs"]
+        negative = self.workflow["7"]["inputs"]
+        load_image = self.workflow["10"]["inputs"]
+        checkpoint = self.workflow["14"]["inputs"]
+
+        sampler["seed"] = self.modify_workflow_value(
             "seed",
             random.randint(0,2**32))
-        self.workflow["3"]["inputs"]["steps"] = await self.modify_workflow_value(
+        sampler["steps"] = self.modify_workflow_value(
             "steps",
             20)
-        self.workflow["3"]["inputs"]["sampler_name"] = await self.modify_workflow_value(
+        sampler["sampler_name"] = self.modify_workflow_value(
             "sampler_name",
             "dpmpp_2m")
-        self.workflow["3"]["inputs"]["scheduler"] = await self.modify_workflow_value(
+        sampler["scheduler"] = self.modify_workflow_value(
             "scheduler",
             "normal")
-        self.workflow["3"]["inputs"]["denoise"] = await self.modify_workflow_value(
+        sampler["denoise"] = self.modify_workflow_value(
             "denoise",
             0.8700000000000001)
         
-        self.workflow["6"]["inputs"]["text"] = await self.modify_workflow_value(
+        positive["text"] = self.modify_workflow_value(
             "prompt",
             "")
-        self.workflow["7"]["inputs"]["text"] = await self.modify_workflow_value(
+        negative["text"] = self.modify_workflow_value(
             "negative_prompt",
             "")
-        self.workflow["10"]["inputs"]["image"] = await self.modify_workflow_value(
+        load_image["image"] = self.modify_workflow_value(
             "input_image",
             "")
-        self.workflow["14"]["inputs"]["ckpt_name"] = await self.modify_workflow_value(
+        checkpoint["ckpt_name"] = self.modify_workflow_value(
             "ckpt_name",
             "v1-5-pruned-emaonly-fp16.safetensors")
         await super().apply_modifications()
@@ -18,34 +18,41 @@ class Text2Image(BaseModifier):
 
     async def apply_modifications(self):
         timestr = time.strftime("%Y%m%d-%H%M%S")
-        self.workflow["3"]["inputs"]["seed"] = await self.modify_workflow_value(
+        # Resolve each node once; every modification below writes into these
+        sampler = self.workflow["3"]["inputs"]
+        checkpoint = self.workflow["4"]["inputs"]
+        latent = self.workflow["5"]["inputs"]
+        positive = self.workflow["6"]["inputs"]
+        negative = self.workflow["7"]["inputs"]
+
+        sampler["seed"] = self.modify_workflow_value(
             "seed",
             random.randint(0, 2**32))
-        self.workflow["3"]["inputs"]["steps"] = await self.modify_workflow_value(
+        sampler["steps"] = self.modify_workflow_value(
             "steps",
             20)
-        self.workflow["3"]["inputs"]["sampler_name"] = await self.modify_workflow_value(
+        sampler["sampler_name"] = self.modify_workflow_value(
             "sampler_name",
             "euler")
-        self.workflow["3"]["inputs"]["scheduler"] = await self.modify_workflow_value(
+        sampler["scheduler"] = self.modify_workflow_value(
             "scheduler",
             "normal")
-        self.workflow["3"]["inputs"]["denoise"] = await self.modify_workflow_value(
+        sampler["denoise"] = self.modify_workflow_value(
             "denoise",
             1.0)
-        self.workflow["4"]["inputs"]["ckpt_name"] = await self.modify_workflow_value(
+        checkpoint["ckpt_name"] = self.modify_workflow_value(
             "ckpt_name",
             "v1-5-pruned-emaonly-fp16.safetensors")
-        self.workflow["5"]["inputs"]["width"] = await self.modify_workflow_value(
+        latent["width"] = self.modify_workflow_value(
             "width",
             512)
-        self.workflow["5"]["inputs"]["height"] = await self.modify_workflow_value(
+        latent["height"] = self.modify_workflow_value(
             "height",
             512)
-        self.workflow["6"]["inputs"]["text"] = await self.modify_workflow_value(
+        positive["text"] = self.modify_workflow_value(
             "prompt",
             "")
-        self.workflow["7"]["inputs"]["text"] = await self.modify_workflow_value(
+        negative["text"] = self.modify_workflow_value(
             "negative_prompt",
             "")
         await super().apply_modifications()
\ No newline at end of file
@@ -1,8 +1,17 @@
+import functools
 import os
-import json
+import re
+import orjson
 from typing import List, Union, Dict, Annotated, Optional
-from urllib.parse import urlparse
-from pydantic import BaseModel, Field, validator, model_validator
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, validator, model_validator
+
+import config as settings
+
+# scheme://netloc, matching what urlparse accepts as having both, in one C-level pass
+URL_PATTERN = re.compile(r'[a-z][a-z0-9+.\-]*://[^/?#]', re.IGNORECASE)
+
+# Example payloads shown in the OpenAPI docs
+PAYLOADS_DIR = './payloads'
 
 
 class S3Config(BaseModel):
@@ -13,6 +22,9 @@ class S3Config(BaseModel):
     region: str = Field(default="")
     connect_timeout: int = Field(default=60)
     connect_attempts: int = Field(default=3)
+    max_pool_connections: int = Field(default=32)
+    # get_config() result, resolved once per instance
+    _resolved: Optional[Dict] = PrivateAttr(default=None)
     
     @staticmethod
     def get_defaults():
@@ -23,24 +35,32 @@ class S3Config(BaseModel):
             "bucket_name": "",
             "region": "",
             "connect_timeout": 60,
-            "connect_attempts": 3
+            "connect_attempts": 3,
+            "max_pool_connections": 32
         }
     
     def get_config(self) -> Dict:
         """Get S3 configuration with environment variable fallbacks"""
-        return {
-            "access_key_id": self.access_key_id or os.environ.get("S3_ACCESS_KEY_ID", ""),
-            "secret_access_key": self.secret_access_key or os.environ.get("S3_SECRET_ACCESS_KEY", ""),
-            "endpoint_url": self.endpoint_url or os.environ.get("S3_ENDPOINT_URL", ""),
-            "bucket_name": self.bucket_name or os.environ.get("S3_BUCKET_NAME", ""),
-            "region": self.region or os.environ.get("S3_REGION", ""),
-            "connect_timeout": self.connect_timeout,
-            "connect_attempts": self.connect_attempts
-        }
+        if self._resolved is None:
+            # Environment fallbacks come from the memoized settings, not os.environ
+            env = settings.S3_CONFIG
+            self._resolved = {
+                "access_key_id": self.access_key_id or env["access_key_id"],
+                "secret_access_key": self.secret_access_key or env["secret_access_key"],
+                "endpoint_url": self.endpoint_url or env["endpoint_url"],
+                "bucket_name": self.bucket_name or env["bucket_name"],
+                "region": self.region or env["region"],
+                "connect_timeout": self.connect_timeout,
+                "connect_attempts": self.connect_attempts,
+                "max_pool_connections": self.max_pool_connections
+            }
+        return dict(self._resolved)  # Return a mutable copy
     
     def is_configured(self) -> bool:
         """Check if S3 is properly configured"""
-        config = self.get_config()
+        if self._resolved is None:
+            self.get_config()
+        config = self._resolved
         return bool(
             config["access_key_id"] and 
             config["secret_access_key"] and 
@@ -68,11 +88,14 @@ class WebHook(BaseModel):
     @staticmethod
     def is_url(value: str) -> bool:
         """Check if a string is a valid URL"""
-        try:
-            parsed = urlparse(value)
-            return bool(parsed.scheme and parsed.netloc)
-        except Exception:
-            return False
+        return isinstance(value, str) and URL_PATTERN.match(value) is not None
+
+
+# (has workflow_json, has modifier) -> validation error
+_WORKFLOW_MODE_ERRORS = {
+    (True, True): "Cannot provide both workflow_json and modifier - they are mutually exclusive",
+    (False, False): "Must provide either workflow_json OR modifier",
+}
 
 
 class Input(BaseModel):
@@ -83,38 +106,32 @@ class Input(BaseModel):
     s3: Optional[S3Config] = Field(default=None)
     webhook: Optional[WebHook] = Field(default=None)
     
+    # Allow extra fields for forward compatibility
+    model_config = ConfigDict(extra="allow")
+    
     @model_validator(mode='after')
     def validate_workflow_mode(self):
         """Ensure workflow_json and modifier are mutually exclusive, and one is provided"""
-        modifier = self.modifier
-        workflow_json = self.workflow_json
-        modifications = self.modifications
-        
-        # Check if both are provided
-        if workflow_json and modifier:
-            raise ValueError("Cannot provide both workflow_json and modifier - they are mutually exclusive")
+        has_modifier = bool(self.modifier)
         
-        # Check if neither are provided
-        if not workflow_json and not modifier:
-            raise ValueError("Must provide either workflow_json OR modifier")
+        # Both or neither of workflow_json and modifier provided
+        error = _WORKFLOW_MODE_ERRORS.get((bool(self.workflow_json), has_modifier))
+        if error:
+            raise ValueError(error)
         
         # Check if modifications provided without modifier
-        if modifications and not modifier:
+        if self.modifications and not has_modifier:
             raise ValueError("modifications can only be provided when modifier is specified")
             
         return self
-    
-    class Config:
-        # Allow extra fields for forward compatibility
-        extra = "allow"
 
 
 class Payload(BaseModel):
     input: Input
     
-    class Config:
-        # Generate schema with examples
-        json_schema_extra = {
+    # Generate schema with examples
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "input": {
                     "request_id": "123e4567-e89b-12d3-a456-426614174000",
@@ -161,41 +178,48 @@ class Payload(BaseModel):
                 }
             }
         }
+    )
     
     @staticmethod
     def get_openapi_examples():
         """Load examples from JSON files in payloads directory"""
-        directory = './payloads'
-        result = {}
-        
-        # Check if directory exists
-        if not os.path.exists(directory):
-            return result
-    
+        # Keyed on the directory mtime, so the files are only read again
+        # after examples are added, removed or renamed
         try:
-            for filename in os.listdir(directory):
-                if filename.endswith('.json'):
-                    filepath = os.path.join(directory, filename)
-                    try:
-                        with open(filepath, 'r', encoding='utf-8') as file:
-                            file_content = json.load(file)
-                        
-                        # Remove the file extension and convert to natural language
-                        key = Payload.snake_to_natural(os.path.splitext(filename)[0])
-                        
-                        # Add the content to the result dictionary
-                        result[key] = {"value": file_content}
-                        
-                    except (json.JSONDecodeError, IOError) as e:
-                        print(f"Warning: Could not load example file {filename}: {e}")
-                        continue
-                        
-        except OSError as e:
-            print(f"Warning: Could not read payloads directory: {e}")
-        
-        return result
+            mtime_ns = os.stat(PAYLOADS_DIR).st_mtime_ns
+        except OSError:
+            return {}
+        return dict(_load_openapi_examples(PAYLOADS_DIR, mtime_ns))
     
     @staticmethod
     def snake_to_natural(snake_str: str) -> str:
         """Convert snake_case to Natural Language"""
-        return ' '.join(word.capitalize() for word in snake_str.split('_'))
\ No newline at end of file
+        return ' '.join(word.capitalize() for word in snake_str.split('_'))
+
+
+@functools.lru_cache(maxsize=1)
+def _load_openapi_examples(directory, mtime_ns):
+    """Read every example payload in directory (mtime_ns is the cache key)"""
+    result = {}
+    try:
+        for filename in os.listdir(directory):
+            if filename.endswith('.json'):
+                filepath = os.path.join(directory, filename)
+                try:
+                    with open(filepath, 'rb') as file:
+                        file_content = orjson.loads(file.read())
+                    
+                    # Remove the file extension and convert to natural language
+                    key = Payload.snake_to_natural(os.path.splitext(filename)[0])
+                    
+                    # Add the content to the result dictionary
+                    result[key] = {"value": file_content}
+                    
+                except (orjson.JSONDecodeError, IOError) as e:
+                    print(f"Warning: Could not load example file {filename}: {e}")
+                    continue
+                    
+    except OSError as e:
+        print(f"Warning: Could not read payloads directory: {e}")
+    
+    return result
@@ -1,6 +1,10 @@
 from pydantic import BaseModel, Field
 from typing import Dict
 
+# A large comfyui_response is held in OUTPUT_DIR/<id>/SPOOLED_RESPONSE_NAME
+# between generation and postprocessing, leaving the field empty meanwhile
+SPOOLED_RESPONSE_NAME = "comfyui_response.json"
+
 class Result(BaseModel):
     id: str
     message: str = Field(default='Request accepted')
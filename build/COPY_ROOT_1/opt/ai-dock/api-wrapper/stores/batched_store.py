@@ -0,0 +1,59 @@
+# batched_store
+import asyncio
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BatchedStore:
+    """
+    Coalesce concurrent get() calls on an aiocache store into one multi_get (MGET)
+    """
+    def __init__(self, backend, max_batch: int = 64, max_delay: float = 0.005):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self, key, default=None, **kwargs):
+        if kwargs:
+            # Per-call options (loads_fn, namespace, ...) can't share a batch
+            return await self.backend.get(key, default, **kwargs)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_loop())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((key, future))
+        value = await future
+        return default if value is None else value
+
+    async def _run_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            # Give concurrent readers a moment to join unless the batch is already full
+            if self._queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.max_delay)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            keys = list(dict.fromkeys(key for key, _ in batch))
+            try:
+                values = dict(zip(keys, await self.backend.multi_get(keys)))
+            except Exception as e:
+                logger.warning(f"Batched read of {len(keys)} keys failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for key, future in batch:
+                # Skip readers that were cancelled while waiting
+                if not future.done():
+                    future.set_result(values[key])
+
+    def __getattr__(self, name):
+        # Writes and everything else go straight to the backend
+        return getattr(self.backend, name)
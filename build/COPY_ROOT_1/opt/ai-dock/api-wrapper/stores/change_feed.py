@@ -0,0 +1,61 @@
+# change_feed
+import asyncio
+import logging
+import uuid
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class RedisChangeFeed:
+    """
+    Broadcast response_store changes to every process over Redis pub/sub
+    """
+    CHANNEL_PREFIX = "req:"
+
+    def __init__(self, redis_config):
+        # Optional dependency: only needed when API_CACHE=redis
+        import redis.asyncio
+
+        self.redis = redis.asyncio.Redis(
+            host=redis_config.host,
+            port=redis_config.port,
+            db=redis_config.db,
+            password=redis_config.password or None,
+            decode_responses=True,
+        )
+        # Tags our own messages so the listener can skip them
+        self.origin = uuid.uuid4().hex
+        self._publishing = set()
+
+    def publish(self, request_id: str):
+        """Announce a change to request_id without blocking the caller"""
+        task = asyncio.create_task(self._publish(request_id))
+        self._publishing.add(task)
+        task.add_done_callback(self._publishing.discard)
+
+    async def _publish(self, request_id: str):
+        try:
+            await self.redis.publish(f"{self.CHANNEL_PREFIX}{request_id}", self.origin)
+        except Exception as e:
+            logger.warning(f"Failed to publish change for {request_id}: {e}")
+
+    async def listen(self, on_remote_change: Callable[[str], None]):
+        """Run the process-wide subscriber, reconnecting on errors"""
+        prefix_length = len(self.CHANNEL_PREFIX)
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(f"{self.CHANNEL_PREFIX}*")
+                logger.info("Subscribed to result change notifications")
+                async for message in pubsub.listen():
+                    if message.get("type") != "pmessage" or message.get("data") == self.origin:
+                        continue
+                    on_remote_change(message["channel"][prefix_length:])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Change feed subscriber failed, reconnecting: {e}")
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.close()
@@ -0,0 +1,61 @@
+# layered_cache
+import time
+from collections import OrderedDict
+
+from pydantic import BaseModel
+
+
+def _snapshot(value):
+    """Shallow copy models so callers never share a cached instance"""
+    return value.model_copy() if isinstance(value, BaseModel) else value
+
+
+class LayeredCache:
+    """
+    In-process LRU (L1) in front of a shared aiocache store such as Redis
+    """
+    def __init__(self, backend, maxsize: int = 10000, ttl: float = 2.0):
+        self.backend = backend
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    async def get(self, key, default=None, **kwargs):
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                return _snapshot(value)
+            del self._entries[key]
+
+        value = await self.backend.get(key, **kwargs)
+        if value is None:
+            return default
+        # A set() that landed while we were waiting on the backend is newer
+        if key not in self._entries:
+            self._remember(key, value)
+        return _snapshot(value)
+
+    async def set(self, key, value, **kwargs):
+        stored = await self.backend.set(key, value, **kwargs)
+        self._remember(key, _snapshot(value))
+        return stored
+
+    async def delete(self, key, **kwargs):
+        self._entries.pop(key, None)
+        return await self.backend.delete(key, **kwargs)
+
+    def forget(self, key):
+        """Drop the local copy of key so the next get() reads the backend"""
+        self._entries.pop(key, None)
+
+    def _remember(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def __getattr__(self, name):
+        # Everything else (exists, multi_get, clear, ...) goes straight to the backend
+        return getattr(self.backend, name)
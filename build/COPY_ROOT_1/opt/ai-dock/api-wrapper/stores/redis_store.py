@@ -0,0 +1,76 @@
+# redis_store
+import functools
+import pickle
+from typing import Optional, Type
+
+from pydantic import BaseModel
+
+
+def connect_redis(redis_config, max_connections: int = 64):
+    """Redis client on a shared connection pool for the stores"""
+    # Optional dependency: only needed when API_CACHE=redis
+    import redis.asyncio
+
+    pool = redis.asyncio.ConnectionPool(
+        host=redis_config.host,
+        port=redis_config.port,
+        db=redis_config.db,
+        password=redis_config.password or None,
+        max_connections=max_connections,
+    )
+    return redis.asyncio.Redis(connection_pool=pool)
+
+
+class RedisStore:
+    """
+    Redis-backed store with the aiocache get/set/delete/multi_get API; values are msgpack encoded
+    """
+    def __init__(self, client, namespace: str, model: Optional[Type[BaseModel]] = None):
+        import msgpack
+
+        self.client = client
+        self.prefix = f"{namespace}:"
+        # Models are stored as plain data and validated back into this type
+        self.model = model
+        self._packb = functools.partial(msgpack.packb, use_bin_type=True)
+        self._unpackb = functools.partial(msgpack.unpackb, raw=False, strict_map_key=False)
+
+    def _dumps(self, value) -> bytes:
+        if isinstance(value, BaseModel):
+            value = value.model_dump()
+        return self._packb(value)
+
+    def _loads(self, data):
+        if data is None:
+            return None
+        value = self._unpackb(data)
+        return self.model.model_validate(value) if self.model is not None else value
+
+    async def get(self, key, default=None):
+        value = self._loads(await self.client.get(self.prefix + key))
+        return default if value is None else value
+
+    async def multi_get(self, keys):
+        if not keys:
+            return []
+        return [self._loads(data) for data in await self.client.mget([self.prefix + key for key in keys])]
+
+    async def set(self, key, value, ttl=None):
+        return await self.client.set(self.prefix + key, self._dumps(value), ex=ttl)
+
+    async def delete(self, key):
+        return await self.client.delete(self.prefix + key)
+
+    async def exists(self, key):
+        return bool(await self.client.exists(self.prefix + key))
+
+
+class PickleRedisStore(RedisStore):
+    """
+    RedisStore that pickles values, for objects that must round-trip without re-validation
+    """
+    def _dumps(self, value) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _loads(self, data):
+        return None if data is None else pickle.loads(data)
@@ -1,15 +1,72 @@
 # generation_worker
 import asyncio
 import aiohttp
+import hashlib
 import json
 import logging
+import orjson
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from pathlib import Path
 from typing import Optional, Dict, Any
-from datetime import datetime
 
-from config import COMFYUI_API_PROMPT, COMFYUI_API_HISTORY, COMFYUI_API_INTERRUPT, COMFYUI_API_WEBSOCKET
+from config import (
+    COMFYUI_API_PROMPT, COMFYUI_API_HISTORY, COMFYUI_API_INTERRUPT, COMFYUI_API_WEBSOCKET,
+    INPUT_DIR, OUTPUT_DIR, WORKFLOW_RESULT_CACHE_TTL
+)
+from responses.result import SPOOLED_RESPONSE_NAME
 
 logger = logging.getLogger(__name__)
 
+# Queued to waiting jobs when the worker's WebSocket drops, so they can check on their prompt
+WS_DISCONNECTED = object()
+
+# Queued to a job's message loop when its request is cancelled
+JOB_CANCELLED = object()
+
+# Backoff (seconds) between re-reads of a job's history while it is still empty
+HISTORY_RETRY_DELAYS = (0.05, 0.2, 0.5)
+
+# Most recent prompts searched when a job's own history entry stays empty
+HISTORY_SCAN_ITEMS = 64
+
+# HTTP requests to ComfyUI in flight at once, across all generation workers
+COMFYUI_HTTP_SLOTS = 16
+_http_slots = asyncio.Semaphore(COMFYUI_HTTP_SLOTS)
+
+# Shared by every JSON POST to ComfyUI
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# A prompt's own history entry is HISTORY_URL_PREFIX + prompt_id
+HISTORY_URL_PREFIX = COMFYUI_API_HISTORY + "/"
+
+# Response bodies larger than this (bytes) are parsed off the event loop
+JSON_THREAD_THRESHOLD = 64 * 1024
+
+# ComfyUI responses larger than this (bytes) are written to disk instead of the response store
+SPOOL_RESPONSE_BYTES = 256 * 1024
+
+# Seconds a job waits for the WebSocket to (re)connect before failing
+WS_CONNECT_TIMEOUT = 30.0
+
+# Seconds between progress writes to the response store
+PROGRESS_FLUSH_INTERVAL = 0.25
+
+# Most recent progress updates kept in a job's execution details
+PROGRESS_HISTORY_SIZE = 512
+
+# ComfyUI responses remembered per worker, keyed by workflow hash (WORKFLOW_RESULT_CACHE_TTL)
+RESULT_CACHE_SIZE = 256
+
+# Longest workflow string input checked for being an input file name
+INPUT_NAME_MAX = 255
+
+# Messages kept for prompts no job has claimed yet (their POST has not returned)
+UNCLAIMED_PROMPTS = 8
+UNCLAIMED_MESSAGES = 256
+
 
 class GenerationWorker:
     """
@@ -22,14 +79,43 @@ class GenerationWorker:
         self.postprocess_queue = kwargs["postprocess_queue"]
         self.request_store = kwargs["request_store"]
         self.response_store = kwargs["response_store"]
+        self.notify = kwargs["notify"]
+        self.cancel_events = kwargs["cancel_events"]
         
         # Configuration
         self.max_wait_time = 3600  # 1 hour maximum wait
         self.ws_url = COMFYUI_API_WEBSOCKET
-        self.client_id = f"worker_{worker_id}_{datetime.now().timestamp()}"
+        self.client_id = f"worker_{worker_id}_{uuid.uuid4().hex}"
+        self._session = None
+
+        # One WebSocket per worker, demultiplexed to per-job queues by prompt_id
+        self._ws_reader = None
+        self._ws_connected = asyncio.Event()
+        self._job_queues: Dict[str, asyncio.Queue] = {}
+        self._unclaimed: "OrderedDict[str, deque]" = OrderedDict()
+
+        # Latest progress message per request, written out by the flusher
+        self._pending_progress: Dict[str, str] = {}
+        self._progress_lock = asyncio.Lock()
+
+        # WebSocket message type -> handler; a handler returns True once the prompt is done
+        self._ws_handlers = {
+            "execution_start": self._on_execution_start,
+            "execution_cached": self._on_execution_cached,
+            "executing": self._on_executing,
+            "progress": self._on_progress,
+            "execution_error": self._on_execution_error,
+            "executed": self._on_executed,
+        }
+
+        # Workflow hash -> (expiry on the monotonic clock, ComfyUI response of the last successful run)
+        self._result_cache: "OrderedDict[str, tuple]" = OrderedDict()
 
     async def work(self):
         logger.info(f"GenerationWorker {self.worker_id}: waiting for jobs")
+        flusher = asyncio.create_task(self._flush_progress())
+        # Connect while waiting for the first job rather than after submitting it
+        self._start_ws_reader()
         while True:
             # Get a task from the job queue
             request_id = await self.generation_queue.get()
@@ -39,6 +125,8 @@ class GenerationWorker:
 
             # Process the job
             logger.info(f"GenerationWorker {self.worker_id} processing job: {request_id}")
+            # Set by the API when this request is cancelled
+            self.cancel_events[request_id] = asyncio.Event()
             
             try:
                 # Get request and result from stores
@@ -56,7 +144,41 @@ class GenerationWorker:
                     await self.postprocess_queue.put(request_id)
                     self.generation_queue.task_done()
                     continue
+
+                # An identical workflow already ran here; reuse its outputs
+                workflow_key = None
+                cached_response = None
+                if WORKFLOW_RESULT_CACHE_TTL > 0:
+                    # Stats the input files the workflow names, so off the event loop
+                    workflow_key = await asyncio.to_thread(self._workflow_key, request.input.workflow_json)
+                    cached_response = self._cached_result(workflow_key)
+                    if cached_response is not None and not await asyncio.to_thread(_outputs_exist, cached_response):
+                        logger.info(f"Outputs of the cached result for {request_id} are gone, running it again")
+                        self._result_cache.pop(workflow_key, None)
+                        cached_response = None
+                if cached_response is not None:
+                    logger.info(f"Job {request_id} matches an earlier workflow, reusing its ComfyUI result")
+                    result.status = "generated"
+                    result.message = "Generation complete (reused result). Queued for post-processing."
+                    result.comfyui_response = cached_response
+                    result.comfyui_response["execution_details"] = {
+                        "prompt_id": None,
+                        "nodes_executed": [],
+                        "progress_updates": [],
+                        "completed": True,
+                        "cached": True,
+                        "error": None
+                    }
+                    await self._spool_response(request_id, result)
+                    await self.response_store.set(request_id, result)
+                    self.notify(request_id)
+                    await self.postprocess_queue.put(request_id)
+                    continue
                     
+                # ComfyUI only sends a prompt's events to a client connected when they
+                # happen; normally this returns at once as the socket is already open
+                await self._ensure_ws()
+
                 # Submit workflow to ComfyUI
                 comfyui_job_id = await self.post_workflow(request)
                 logger.info(f"Submitted job {request_id} to ComfyUI as {comfyui_job_id}")
@@ -65,6 +187,7 @@ class GenerationWorker:
                 result.status = "generating"
                 result.message = f"Generation started (ComfyUI job: {comfyui_job_id})"
                 await self.response_store.set(request_id, result)
+                self.notify(request_id)
 
                 # Check if job is already complete (cached result)
                 is_cached = await self.check_if_cached(comfyui_job_id)
@@ -89,18 +212,26 @@ class GenerationWorker:
                 # Get the final result from ComfyUI history
                 comfyui_response = await self.get_result(comfyui_job_id)
                 logger.info(f"Retrieved ComfyUI result for {request_id}")
-                logger.debug(f"ComfyUI response structure: {json.dumps(comfyui_response, indent=2)[:500]}...")  # First 500 chars
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"ComfyUI response structure: {json.dumps(comfyui_response, indent=2)[:500]}...")  # First 500 chars
                 
+                # Final status supersedes any progress message still pending
+                await self._discard_progress(request_id)
+                self._remember_result(workflow_key, comfyui_response)
+
                 # Update result with success
                 result.status = "generated"
                 result.message = "Generation complete. Queued for post-processing."
                 result.comfyui_response = comfyui_response
                 # Store execution details in the comfyui_response if needed
                 if execution_result:
+                    execution_result["progress_updates"] = list(execution_result["progress_updates"])
                     # Merge execution details into the response
                     if isinstance(result.comfyui_response, dict):
                         result.comfyui_response["execution_details"] = execution_result
+                await self._spool_response(request_id, result)
                 await self.response_store.set(request_id, result)
+                self.notify(request_id)
                 
                 # Send for post-processing
                 await self.postprocess_queue.put(request_id)
@@ -110,12 +241,15 @@ class GenerationWorker:
                 logger.error(f"GenerationWorker {self.worker_id} failed job {request_id}: {e}")
                 
                 try:
+                    await self._discard_progress(request_id)
+
                     # Update result to show failure
                     result = await self.response_store.get(request_id)
                     if result:
                         result.status = "failed"
                         result.message = f"Generation failed: {str(e)}"
                         await self.response_store.set(request_id, result)
+                        self.notify(request_id)
                     
                     # Send job to postprocess for cleanup
                     await self.postprocess_queue.put(request_id)
@@ -125,10 +259,170 @@ class GenerationWorker:
             
             finally:
                 # Mark the job as complete
+                self.cancel_events.pop(request_id, None)
                 self.generation_queue.task_done()
 
+        flusher.cancel()
+        await self.aclose()
         logger.info(f"GenerationWorker {self.worker_id} finished")
 
+    @staticmethod
+    def _workflow_key(workflow: Dict) -> Optional[str]:
+        """Canonical digest of a workflow and the input files it names, or None
+        if it cannot be serialized"""
+        try:
+            workflow_bytes = orjson.dumps(workflow, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return None
+        digest = hashlib.blake2b(workflow_bytes, digest_size=16)
+        # A file replaced under the same name must not match the earlier run
+        for name in sorted(_input_file_names(workflow)):
+            try:
+                st = os.stat(os.path.join(INPUT_DIR, name))
+            except (OSError, ValueError):
+                continue
+            digest.update(f"\0{name}\0{st.st_size}\0{st.st_mtime_ns}".encode())
+        return digest.hexdigest()
+
+    def _cached_result(self, key: Optional[str]) -> Optional[dict]:
+        """Copy of the unexpired ComfyUI response cached for key, if any"""
+        entry = self._result_cache.get(key) if key is not None else None
+        if entry is None:
+            return None
+        expires_at, comfyui_response = entry
+        if expires_at <= time.monotonic():
+            del self._result_cache[key]
+            return None
+        self._result_cache.move_to_end(key)
+        return dict(comfyui_response)  # execution_details is set on the copy
+
+    def _remember_result(self, key: Optional[str], comfyui_response) -> None:
+        """Cache a successful run's ComfyUI response, evicting the oldest"""
+        if key is None or not _reusable_response(comfyui_response):
+            return
+        self._result_cache[key] = (time.monotonic() + WORKFLOW_RESULT_CACHE_TTL, dict(comfyui_response))
+        self._result_cache.move_to_end(key)
+        while len(self._result_cache) > RESULT_CACHE_SIZE:
+            self._result_cache.popitem(last=False)
+
+    async def _spool_response(self, request_id: str, result) -> None:
+        """Move a large comfyui_response out of the result, into the job's output directory"""
+        path = Path(OUTPUT_DIR) / request_id / SPOOLED_RESPONSE_NAME
+        # Serializing (just to measure it) happens in the thread too
+        size = await asyncio.to_thread(_spool_if_large, path, result.comfyui_response)
+        if size is None:
+            return
+        logger.info(f"Spooled {size} byte ComfyUI response for {request_id}")
+        result.comfyui_response = {}
+
+    def _get_session(self):
+        """HTTP/WebSocket session shared by every ComfyUI call this worker makes"""
+        if self._session is None or self._session.closed:
+            # HTTP calls pass their own deadline; the WebSocket wait is bounded by
+            # max_wait_time in the receive loop, so only connecting is capped here
+            self._session = aiohttp.ClientSession(
+                # One connection per HTTP slot, plus the WebSocket
+                connector=aiohttp.TCPConnector(limit=0, limit_per_host=COMFYUI_HTTP_SLOTS + 1, keepalive_timeout=75),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=30)
+            )
+        return self._session
+
+    async def aclose(self):
+        """Stop the WebSocket reader and close the shared session"""
+        if self._ws_reader is not None:
+            self._ws_reader.cancel()
+            try:
+                await self._ws_reader
+            except asyncio.CancelledError:
+                pass
+            self._ws_reader = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _start_ws_reader(self):
+        """Start the WebSocket reader unless it is already running"""
+        if self._ws_reader is None or self._ws_reader.done():
+            self._ws_reader = asyncio.create_task(self._read_ws())
+
+    async def _ensure_ws(self):
+        """Start the WebSocket reader if needed and wait until it is connected"""
+        self._start_ws_reader()
+        try:
+            await asyncio.wait_for(self._ws_connected.wait(), timeout=WS_CONNECT_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise Exception(f"Could not connect to ComfyUI WebSocket at {self.ws_url}")
+
+    async def _read_ws(self):
+        """Hold the worker's WebSocket open, reconnecting as needed, and route its messages"""
+        backoff = 1.0
+        while True:
+            try:
+                logger.info(f"Connecting to ComfyUI WebSocket at {self.ws_url}")
+                async with self._get_session().ws_connect(
+                    self.ws_url,
+                    params={"clientId": self.client_id}
+                ) as ws:
+                    logger.info(f"GenerationWorker {self.worker_id}: WebSocket connected")
+                    self._ws_connected.set()
+                    backoff = 1.0
+                    async for msg in ws:
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            self._route_ws_message(msg.data)
+                        elif msg.type == aiohttp.WSMsgType.ERROR:
+                            logger.error(f"WebSocket error: {ws.exception()}")
+                            break
+                logger.warning("WebSocket connection closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"WebSocket connection error: {e}")
+            finally:
+                self._ws_connected.clear()
+
+            for queue in self._job_queues.values():
+                queue.put_nowait(WS_DISCONNECTED)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def _route_ws_message(self, raw):
+        """Queue a WebSocket message for the job waiting on its prompt"""
+        # Frames that carry no prompt_id (status, monitoring) are dropped unparsed
+        if '"prompt_id"' not in raw:
+            return
+        try:
+            data = orjson.loads(raw)
+        except orjson.JSONDecodeError as e:
+            logger.warning(f"Failed to parse WebSocket message: {e}")
+            logger.debug(f"Raw message: {raw}")
+            return
+
+        payload = data.get("data")
+        prompt_id = payload.get("prompt_id") if isinstance(payload, dict) else None
+        if prompt_id is None:
+            return
+
+        queue = self._job_queues.get(prompt_id)
+        if queue is not None:
+            queue.put_nowait(data)
+            return
+
+        # Hold on to it in case the job for this prompt registers shortly
+        pending = self._unclaimed.get(prompt_id)
+        if pending is None:
+            pending = self._unclaimed[prompt_id] = deque(maxlen=UNCLAIMED_MESSAGES)
+            if len(self._unclaimed) > UNCLAIMED_PROMPTS:
+                self._unclaimed.popitem(last=False)
+        pending.append(data)
+
+    def _register_job(self, comfyui_job_id: str) -> asyncio.Queue:
+        """Create the message queue for a prompt, seeded with anything already received"""
+        queue = asyncio.Queue()
+        for data in self._unclaimed.pop(comfyui_job_id, ()):
+            queue.put_nowait(data)
+        self._job_queues[comfyui_job_id] = queue
+        return queue
+
     async def post_workflow(self, request) -> str:
         """Submit workflow to ComfyUI API"""
         payload = {
@@ -136,74 +430,134 @@ class GenerationWorker:
             "client_id": self.client_id  # Use our worker's client ID
         }
         
-        headers = {
-            'Content-Type': 'application/json'
-        }
-        
         timeout = aiohttp.ClientTimeout(total=30)  # 30 second timeout
         
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            try:
-                logger.debug(f"Posting workflow to {COMFYUI_API_PROMPT}")
+        session = self._get_session()
+        try:
+            logger.debug(f"Posting workflow to {COMFYUI_API_PROMPT}")
+            if logger.isEnabledFor(logging.DEBUG):
                 logger.debug(f"Workflow keys: {list(request.input.workflow_json.keys()) if isinstance(request.input.workflow_json, dict) else 'not a dict'}")
+            
+            async with _http_slots, session.post(
+                COMFYUI_API_PROMPT, 
+                data=orjson.dumps(payload),
+                headers=_JSON_HEADERS,
+                timeout=timeout
+            ) as response:
                 
-                async with session.post(
-                    COMFYUI_API_PROMPT, 
-                    data=json.dumps(payload),
-                    headers=headers
-                ) as response:
-                    
-                    response_text = await response.text()
-                    logger.debug(f"ComfyUI API response status: {response.status}")
-                    logger.debug(f"ComfyUI API response: {response_text[:500]}...")  # First 500 chars
-                    
-                    if response.status >= 400:
-                        raise aiohttp.ClientResponseError(
-                            request_info=response.request_info,
-                            history=response.history,
-                            status=response.status,
-                            message=f"ComfyUI API error: {response_text}"
-                        )
-                    
-                    response_data = json.loads(response_text)
+                raw = await response.read()
+                logger.debug(f"ComfyUI API response status: {response.status}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"ComfyUI API response: {raw[:500].decode(errors='replace')}...")  # First 500 chars
+                
+                if response.status >= 400:
+                    raise aiohttp.ClientResponseError(
+                        request_info=response.request_info,
+                        history=response.history,
+                        status=response.status,
+                        message=f"ComfyUI API error: {raw.decode(errors='replace')}"
+                    )
+                
+                response_data = await self._loads(raw)
+                
+                if "prompt_id" in response_data:
+                    return response_data["prompt_id"]
+                elif "node_errors" in response_data:
+                    error_details = json.dumps(response_data["node_errors"], indent=2)
+                    raise Exception(f"ComfyUI node errors: {error_details}")
+                elif "error" in response_data:
+                    raise Exception(f"ComfyUI error: {response_data['error']}")
+                else:
+                    raise Exception(f"Unexpected response from ComfyUI: {response_data}")
                     
-                    if "prompt_id" in response_data:
-                        return response_data["prompt_id"]
-                    elif "node_errors" in response_data:
-                        error_details = json.dumps(response_data["node_errors"], indent=2)
-                        raise Exception(f"ComfyUI node errors: {error_details}")
-                    elif "error" in response_data:
-                        raise Exception(f"ComfyUI error: {response_data['error']}")
-                    else:
-                        raise Exception(f"Unexpected response from ComfyUI: {response_data}")
-                        
-            except asyncio.TimeoutError:
-                raise Exception("Timeout posting workflow to ComfyUI")
-            except aiohttp.ClientError as e:
-                raise Exception(f"Network error posting to ComfyUI: {e}")
-            except json.JSONDecodeError as e:
-                raise Exception(f"Invalid JSON response from ComfyUI: {e}")
+        except asyncio.TimeoutError:
+            raise Exception("Timeout posting workflow to ComfyUI")
+        except aiohttp.ClientError as e:
+            raise Exception(f"Network error posting to ComfyUI: {e}")
+        except json.JSONDecodeError as e:
+            raise Exception(f"Invalid JSON response from ComfyUI: {e}")
+
+    @staticmethod
+    async def _loads(raw: bytes):
+        """Parse a JSON response body, in a thread when it is large"""
+        if len(raw) > JSON_THREAD_THRESHOLD:
+            return await asyncio.to_thread(orjson.loads, raw)
+        return orjson.loads(raw)
 
     async def check_if_cached(self, comfyui_job_id: str) -> bool:
         """Check if job is already complete (cached result)"""
-        await asyncio.sleep(0.5)  # Give ComfyUI a moment to process
-        
         timeout = aiohttp.ClientTimeout(total=5)
         try:
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                url = f"{COMFYUI_API_HISTORY}/{comfyui_job_id}"
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        history_data = await response.json()
-                        # If we get non-empty data, the job is complete
-                        if history_data and history_data != {}:
-                            logger.info(f"Job {comfyui_job_id} found in history (cached)")
-                            return True
+            session = self._get_session()
+            url = HISTORY_URL_PREFIX + comfyui_job_id
+            async with _http_slots, session.get(url, timeout=timeout) as response:
+                if response.status == 200:
+                    history_data = await self._loads(await response.read())
+                    # If we get non-empty data, the job is complete
+                    if history_data and history_data != {}:
+                        logger.info(f"Job {comfyui_job_id} found in history (cached)")
+                        return True
             return False
         except Exception as e:
             logger.debug(f"Error checking cache status: {e}")
             return False
     
+    async def _poll_until_cached(self, comfyui_job_id: str, interval: float) -> bool:
+        """Return once the job appears in history, checking every interval seconds"""
+        while True:
+            await asyncio.sleep(interval)
+            if await self.check_if_cached(comfyui_job_id):
+                return True
+
+    def _on_execution_start(self, message, comfyui_job_id, request_id, execution_result, elapsed):
+        logger.info("Execution started for %s", comfyui_job_id)
+        self._update_progress(request_id, "Execution started...")
+
+    def _on_execution_cached(self, message, comfyui_job_id, request_id, execution_result, elapsed):
+        nodes = message.get("nodes", [])
+        logger.info("Using cached results for nodes: %s", nodes)
+        execution_result["nodes_executed"].extend(nodes)
+
+    def _on_executing(self, message, comfyui_job_id, request_id, execution_result, elapsed):
+        node = message.get("node")
+        if node:
+            logger.info("Executing node: %s", node)
+            execution_result["nodes_executed"].append(node)
+            self._update_progress(request_id, f"Processing node: {node}")
+        elif node is None:
+            # node = None means execution is complete
+            logger.info("Execution complete for %s", comfyui_job_id)
+            execution_result["completed"] = True
+            return True
+
+    def _on_progress(self, message, comfyui_job_id, request_id, execution_result, elapsed):
+        value = message.get("value", 0)
+        max_value = message.get("max", 100)
+        
+        progress_pct = (value / max_value * 100) if max_value > 0 else 0
+        progress_msg = f"Progress: {progress_pct:.1f}% ({value}/{max_value})"
+        
+        logger.info("Progress update: %s", progress_msg)
+        execution_result["progress_updates"].append({
+            "time": elapsed,
+            "value": value,
+            "max": max_value,
+            "percentage": progress_pct
+        })
+        
+        self._update_progress(request_id, progress_msg)
+
+    def _on_execution_error(self, message, comfyui_job_id, request_id, execution_result, elapsed):
+        error_msg = f"Execution error: {message}"
+        logger.error(error_msg)
+        execution_result["error"] = message
+        raise Exception(error_msg)
+
+    def _on_executed(self, message, comfyui_job_id, request_id, execution_result, elapsed):
+        logger.info("Node %s executed successfully", message.get("node"))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Node output: {json.dumps(message.get('output'), indent=2)[:500]}...")
+
     async def wait_for_completion_websocket(self, comfyui_job_id: str, request_id: str) -> Dict[str, Any]:
         """
         Wait for ComfyUI job completion using WebSocket connection
@@ -212,267 +566,216 @@ class GenerationWorker:
         execution_result = {
             "prompt_id": comfyui_job_id,
             "nodes_executed": [],
-            "progress_updates": [],
+            "progress_updates": deque(maxlen=PROGRESS_HISTORY_SIZE),
             "completed": False,
             "error": None
         }
         
-        timeout = aiohttp.ClientTimeout(total=self.max_wait_time)
+        await self._ensure_ws()
+        queue = self._register_job(comfyui_job_id)
+        cancel_watch = asyncio.create_task(
+            self._forward_cancel(self.cancel_events[request_id], queue)
+        )
         
         try:
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                logger.info(f"Connecting to ComfyUI WebSocket at {self.ws_url}")
-                
-                async with session.ws_connect(
-                    self.ws_url,
-                    params={"clientId": self.client_id}
-                ) as ws:
-                    logger.info(f"WebSocket connected for job {comfyui_job_id}")
+            # Start listening for messages
+            loop = asyncio.get_running_loop()
+            start_time = loop.time()
+            last_message_time = start_time
+            
+            # Progressive timeout strategy
+            initial_timeout = 30.0  # 30 seconds to receive first message
+            message_timeout = 60.0  # 60 seconds between messages after first message received
+            max_no_message_retries = 3  # Number of times to retry when no messages received
+            no_message_retry_count = 0
+            # Message that arrived while waiting between retries
+            early_message = None
+            
+            while True:
+                try:
+                    # Set timeout based on whether we've received any messages
+                    timeout_duration = initial_timeout if last_message_time == start_time else message_timeout
                     
-                    # Start listening for messages
-                    start_time = asyncio.get_event_loop().time()
-                    last_update_time = start_time
-                    last_message_time = start_time
-                    last_cancellation_check = start_time
+                    if early_message is not None:
+                        data, early_message = early_message, None
+                    else:
+                        data = await asyncio.wait_for(
+                            queue.get(), 
+                            timeout=timeout_duration
+                        )
+                    
+                    if data is JOB_CANCELLED:
+                        logger.info("Job %s was cancelled during generation - aborting WebSocket", request_id)
+                        # Cancel the ComfyUI job
+                        await self.cancel_comfyui_job(comfyui_job_id)
+                        raise Exception(f"Job {request_id} was cancelled during generation")
                     
-                    # Progressive timeout strategy
-                    initial_timeout = 30.0  # 30 seconds to receive first message
-                    message_timeout = 60.0  # 60 seconds between messages after first message received
-                    max_no_message_retries = 3  # Number of times to retry when no messages received
+                    if data is WS_DISCONNECTED:
+                        # The reader is reconnecting; see whether the job finished meanwhile
+                        try:
+                            if await self.check_if_cached(comfyui_job_id):
+                                logger.info("Job %s completed while the WebSocket was down", comfyui_job_id)
+                                execution_result["completed"] = True
+                                return execution_result
+                        except Exception as check_error:
+                            logger.warning(f"Error checking job status after disconnect: {check_error}")
+                        continue
+                    
+                    last_message_time = loop.time()
+                    # Reset retry count since we received a message
                     no_message_retry_count = 0
                     
-                    while True:
+                    message_type = data.get("type")
+                    logger.debug("WebSocket message type: %s", message_type)
+                    
+                    handler = self._ws_handlers.get(message_type)
+                    if handler and handler(
+                        data.get("data") or {}, comfyui_job_id, request_id, execution_result,
+                        last_message_time - start_time
+                    ):
+                        return execution_result
+                
+                except asyncio.TimeoutError:
+                    no_message_retry_count += 1
+                    elapsed = loop.time() - start_time
+                    
+                    # If we haven't received any messages, try to check job status before giving up
+                    if last_message_time == start_time:
+                        logger.warning(f"No WebSocket messages received for {comfyui_job_id} "
+                                    f"(attempt {no_message_retry_count}/{max_no_message_retries}) "
+                                    f"after {elapsed:.1f}s - checking job status")
+                        
+                        # Check if the job is complete/cached
+                        try:
+                            if await self.check_if_cached(comfyui_job_id):
+                                logger.info("Job %s is complete (cached)", comfyui_job_id)
+                                execution_result["completed"] = True
+                                execution_result["cached"] = True
+                                return execution_result
+                        except Exception as check_error:
+                            logger.warning(f"Error checking job status: {check_error}")
+                        
+                        # If we've exhausted retries, give up
+                        if no_message_retry_count >= max_no_message_retries:
+                            logger.error(f"No WebSocket messages received for {comfyui_job_id} "
+                                    f"after {max_no_message_retries} attempts and {elapsed:.1f}s")
+                            raise Exception(f"No WebSocket messages received for job {comfyui_job_id} "
+                                        f"after {max_no_message_retries} retry attempts")
+                        
+                        # Wait a bit before retrying (exponential backoff)
+                        wait_time = min(5 * (2 ** (no_message_retry_count - 1)), 30)  # Cap at 30 seconds
+                        logger.info("Waiting %ss before retry %s", wait_time, no_message_retry_count + 1)
+                        # Keep listening, and polling history, so completion isn't noticed late
+                        next_message = asyncio.ensure_future(queue.get())
+                        probe = asyncio.create_task(self._poll_until_cached(comfyui_job_id, interval=1.0))
                         try:
-                            # Set timeout based on whether we've received any messages
-                            timeout_duration = initial_timeout if last_message_time == start_time else message_timeout
-                            
-                            msg = await asyncio.wait_for(
-                                ws.receive(), 
-                                timeout=timeout_duration
+                            done, _ = await asyncio.wait(
+                                {next_message, probe},
+                                timeout=wait_time,
+                                return_when=asyncio.FIRST_COMPLETED
                             )
-                            
-                            last_message_time = asyncio.get_event_loop().time()
-                            # Reset retry count since we received a message
-                            no_message_retry_count = 0
-
-                            current_time = asyncio.get_event_loop().time()
-                            if current_time - last_cancellation_check > 5.0:  # Check every 5 seconds
-                                if await self._check_if_cancelled(request_id):
-                                    logger.info(f"Job {request_id} was cancelled during generation - aborting WebSocket")
-                                    # Cancel the ComfyUI job
-                                    await self.cancel_comfyui_job(comfyui_job_id)
-                                    raise Exception(f"Job {request_id} was cancelled during generation")
-                                last_cancellation_check = current_time
-                            
-                            if msg.type == aiohttp.WSMsgType.TEXT:
-                                try:
-                                    data = json.loads(msg.data)
-                                    message_type = data.get("type")
-                                    
-                                    logger.debug(f"WebSocket message type: {message_type}")
-                                    
-                                    # Check if this message is for our prompt
-                                    if data.get("data", {}).get("prompt_id") == comfyui_job_id:
-                                        
-                                        if message_type == "execution_start":
-                                            logger.info(f"Execution started for {comfyui_job_id}")
-                                            await self._update_progress(
-                                                request_id, 
-                                                "Execution started..."
-                                            )
-                                        
-                                        elif message_type == "execution_cached":
-                                            nodes = data.get("data", {}).get("nodes", [])
-                                            logger.info(f"Using cached results for nodes: {nodes}")
-                                            execution_result["nodes_executed"].extend(nodes)
-                                        
-                                        elif message_type == "executing":
-                                            node = data.get("data", {}).get("node")
-                                            if node:
-                                                logger.info(f"Executing node: {node}")
-                                                execution_result["nodes_executed"].append(node)
-                                                await self._update_progress(
-                                                    request_id, 
-                                                    f"Processing node: {node}"
-                                                )
-                                            elif data.get("data", {}).get("node") is None:
-                                                # node = None means execution is complete
-                                                logger.info(f"Execution complete for {comfyui_job_id}")
-                                                execution_result["completed"] = True
-                                                return execution_result
-                                        
-                                        elif message_type == "progress":
-                                            progress_data = data.get("data", {})
-                                            value = progress_data.get("value", 0)
-                                            max_value = progress_data.get("max", 100)
-                                            
-                                            progress_pct = (value / max_value * 100) if max_value > 0 else 0
-                                            progress_msg = f"Progress: {progress_pct:.1f}% ({value}/{max_value})"
-                                            
-                                            logger.info(f"Progress update: {progress_msg}")
-                                            execution_result["progress_updates"].append({
-                                                "time": asyncio.get_event_loop().time() - start_time,
-                                                "value": value,
-                                                "max": max_value,
-                                                "percentage": progress_pct
-                                            })
-                                            
-                                            # Update status every few seconds to avoid spam
-                                            current_time = asyncio.get_event_loop().time()
-                                            if current_time - last_update_time > 2:  # Update every 2 seconds
-                                                await self._update_progress(request_id, progress_msg)
-                                                last_update_time = current_time
-                                        
-                                        elif message_type == "execution_error":
-                                            error_data = data.get("data", {})
-                                            error_msg = f"Execution error: {error_data}"
-                                            logger.error(error_msg)
-                                            execution_result["error"] = error_data
-                                            raise Exception(error_msg)
-                                        
-                                        elif message_type == "executed":
-                                            node = data.get("data", {}).get("node")
-                                            output = data.get("data", {}).get("output")
-                                            logger.info(f"Node {node} executed successfully")
-                                            logger.debug(f"Node output: {json.dumps(output, indent=2)[:500]}...")
-                                    
-                                except json.JSONDecodeError as e:
-                                    logger.warning(f"Failed to parse WebSocket message: {e}")
-                                    logger.debug(f"Raw message: {msg.data}")
+                        finally:
+                            probe.cancel()
+                            if not next_message.done():
+                                next_message.cancel()
+                        if next_message in done:
+                            early_message = next_message.result()
+                        elif probe in done:
+                            logger.info("Job %s is complete (cached)", comfyui_job_id)
+                            execution_result["completed"] = True
+                            execution_result["cached"] = True
+                            return execution_result
                         
-                            elif msg.type == aiohttp.WSMsgType.ERROR:
-                                logger.error(f"WebSocket error: {ws.exception()}")
-                                raise Exception(f"WebSocket error: {ws.exception()}")
-                            
-                            elif msg.type == aiohttp.WSMsgType.CLOSED:
-                                logger.warning("WebSocket connection closed")
-                                break
-                            
-                        except asyncio.TimeoutError:
-                            no_message_retry_count += 1
-                            elapsed = asyncio.get_event_loop().time() - start_time
-                            
-                            # If we haven't received any messages, try to check job status before giving up
-                            if last_message_time == start_time:
-                                logger.warning(f"No WebSocket messages received for {comfyui_job_id} "
-                                            f"(attempt {no_message_retry_count}/{max_no_message_retries}) "
-                                            f"after {elapsed:.1f}s - checking job status")
-                                
-                                # Check if the job is complete/cached
-                                try:
-                                    if await self.check_if_cached(comfyui_job_id):
-                                        logger.info(f"Job {comfyui_job_id} is complete (cached)")
-                                        execution_result["completed"] = True
-                                        execution_result["cached"] = True
-                                        return execution_result
-                                except Exception as check_error:
-                                    logger.warning(f"Error checking job status: {check_error}")
-                                
-                                # If we've exhausted retries, give up
-                                if no_message_retry_count >= max_no_message_retries:
-                                    logger.error(f"No WebSocket messages received for {comfyui_job_id} "
-                                            f"after {max_no_message_retries} attempts and {elapsed:.1f}s")
-                                    raise Exception(f"No WebSocket messages received for job {comfyui_job_id} "
-                                                f"after {max_no_message_retries} retry attempts")
-                                
-                                # Wait a bit before retrying (exponential backoff)
-                                wait_time = min(5 * (2 ** (no_message_retry_count - 1)), 30)  # Cap at 30 seconds
-                                logger.info(f"Waiting {wait_time}s before retry {no_message_retry_count + 1}")
-                                await asyncio.sleep(wait_time)
-                                
-                            else:
-                                # We were receiving messages but they stopped
-                                logger.warning(f"WebSocket message timeout for job {comfyui_job_id} "
-                                            f"(no message for {timeout_duration}s, elapsed: {elapsed:.1f}s)")
-                                
-                                # Try to check job status before giving up completely
-                                try:
-                                    if await self.check_if_cached(comfyui_job_id):
-                                        logger.info(f"Job {comfyui_job_id} completed despite message timeout")
-                                        execution_result["completed"] = True
-                                        return execution_result
-                                except Exception as check_error:
-                                    logger.warning(f"Error checking job status after timeout: {check_error}")
-                                
-                                # If still no completion after timeout, raise error
-                                raise Exception(f"WebSocket message timeout for job {comfyui_job_id} "
-                                            f"after {timeout_duration} seconds without messages")
+                    else:
+                        # We were receiving messages but they stopped
+                        logger.warning(f"WebSocket message timeout for job {comfyui_job_id} "
+                                    f"(no message for {timeout_duration}s, elapsed: {elapsed:.1f}s)")
                         
-                        # Check for overall timeout
-                        elapsed = asyncio.get_event_loop().time() - start_time
-                        if elapsed > self.max_wait_time:
-                            raise Exception(f"Timeout waiting for job {comfyui_job_id} after {elapsed:.1f} seconds")
-                    
-                    # If we exit the loop without completion, something went wrong
-                    if not execution_result["completed"]:
-                        # Final check before giving up
+                        # Try to check job status before giving up completely
                         try:
                             if await self.check_if_cached(comfyui_job_id):
-                                logger.info(f"Job {comfyui_job_id} completed (final check)")
+                                logger.info("Job %s completed despite message timeout", comfyui_job_id)
                                 execution_result["completed"] = True
                                 return execution_result
                         except Exception as check_error:
-                            logger.warning(f"Error in final job status check: {check_error}")
+                            logger.warning(f"Error checking job status after timeout: {check_error}")
                         
-                        raise Exception(f"WebSocket closed without completion for job {comfyui_job_id}")
-                    
-                    return execution_result
-                    
-        except asyncio.TimeoutError:
-            logger.warning(f"WebSocket overall timeout for job {comfyui_job_id} - attempting to cancel")
-            await self.cancel_comfyui_job(comfyui_job_id)
-            raise Exception(f"WebSocket timeout for job {comfyui_job_id}")
-        except aiohttp.ClientError as e:
-            # Cancel the job since we can't monitor it anymore
-            logger.warning(f"WebSocket connection error for job {comfyui_job_id} - attempting to cancel")
-            await self.cancel_comfyui_job(comfyui_job_id)
-            raise Exception(f"WebSocket connection error: {e}")
+                        # If still no completion after timeout, raise error
+                        raise Exception(f"WebSocket message timeout for job {comfyui_job_id} "
+                                    f"after {timeout_duration} seconds without messages")
+                
+                # Check for overall timeout
+                elapsed = loop.time() - start_time
+                if elapsed > self.max_wait_time:
+                    raise Exception(f"Timeout waiting for job {comfyui_job_id} after {elapsed:.1f} seconds")
+            
         except Exception as e:
             logger.error(f"WebSocket error for job {comfyui_job_id}: {e}")
             # Cancel on other errors to be safe
             await self.cancel_comfyui_job(comfyui_job_id)
             raise
+        finally:
+            cancel_watch.cancel()
+            self._job_queues.pop(comfyui_job_id, None)
 
-    async def _update_progress(self, request_id: str, message: str):
-        """Helper to update progress in the response store"""
-        try:
-            result = await self.response_store.get(request_id)
-            if result:
-                result.message = message
-                await self.response_store.set(request_id, result)
-        except Exception as e:
-            logger.warning(f"Failed to update progress for {request_id}: {e}")
+    def _update_progress(self, request_id: str, message: str):
+        """Record the latest progress message; the flusher writes it to the store"""
+        self._pending_progress[request_id] = message
+
+    async def _flush_progress(self):
+        """Write pending progress messages every PROGRESS_FLUSH_INTERVAL"""
+        while True:
+            await asyncio.sleep(PROGRESS_FLUSH_INTERVAL)
+            if not self._pending_progress:
+                continue
+            async with self._progress_lock:
+                pending, self._pending_progress = self._pending_progress, {}
+                for request_id, message in pending.items():
+                    try:
+                        result = await self.response_store.get(request_id)
+                        if result:
+                            result.message = message
+                            await self.response_store.set(request_id, result)
+                            self.notify(request_id)
+                    except Exception as e:
+                        logger.warning(f"Failed to update progress for {request_id}: {e}")
+
+    async def _discard_progress(self, request_id: str):
+        """Drop unwritten progress for a job and wait out any flush in flight"""
+        self._pending_progress.pop(request_id, None)
+        async with self._progress_lock:
+            pass
 
     async def get_result(self, comfyui_job_id: str) -> Optional[dict]:
         """Get the final result from ComfyUI history"""
         timeout = aiohttp.ClientTimeout(total=30)
         
-        # Wait a moment for history to be updated
-        await asyncio.sleep(0.5)
-        
         try:
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                url = f"{COMFYUI_API_HISTORY}/{comfyui_job_id}"
-                logger.debug(f"Fetching result from: {url}")
-                
-                async with session.get(url) as response:
-                    response_text = await response.text()
+            session = self._get_session()
+            url = HISTORY_URL_PREFIX + comfyui_job_id
+            logger.debug(f"Fetching result from: {url}")
+            
+            # Completion was already signalled, so history is normally ready on the
+            # first request; briefly retry in case it lags behind the WebSocket
+            for delay in (0, *HISTORY_RETRY_DELAYS):
+                if delay:
+                    await asyncio.sleep(delay)
+                async with _http_slots, session.get(url, timeout=timeout) as response:
+                    raw = await response.read()
                     logger.debug(f"History API status: {response.status}")
                     
-                    if response.status == 200:
-                        history_data = json.loads(response_text)
-                        
-                        # Check if we got actual data
-                        if not history_data or history_data == {}:
-                            logger.warning(f"Empty history response for job {comfyui_job_id}")
-                            # Try the general history endpoint
-                            return await self._get_result_from_general_history(comfyui_job_id)
-                        
+                    if response.status != 200:
+                        raise Exception(f"Failed to get result (status {response.status}): {raw.decode(errors='replace')}")
+                    
+                    history_data = await self._loads(raw)
+                    if history_data:
                         logger.info(f"Retrieved ComfyUI history for job {comfyui_job_id}")
                         return history_data
-                    else:
-                        raise Exception(f"Failed to get result (status {response.status}): {response_text}")
-                        
+            
+            logger.warning(f"Empty history response for job {comfyui_job_id}")
+            # Try the general history endpoint
+            return await self._get_result_from_general_history(comfyui_job_id)
+                    
         except asyncio.TimeoutError:
             raise Exception(f"Timeout getting result for job {comfyui_job_id}")
         except aiohttp.ClientError as e:
@@ -485,37 +788,34 @@ class GenerationWorker:
         timeout = aiohttp.ClientTimeout(total=30)
         
         try:
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                # Try the general history endpoint
-                url = COMFYUI_API_HISTORY.rstrip(f"/{comfyui_job_id}")
-                logger.debug(f"Trying general history endpoint: {url}")
+            session = self._get_session()
+            # The job has only just finished, so it is among the latest entries;
+            # don't pull (and parse) the server's whole history to find it
+            url = COMFYUI_API_HISTORY
+            logger.debug(f"Trying general history endpoint: {url}")
                 
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        all_history = await response.json()
-                        
-                        # Look for our job in the history
-                        if comfyui_job_id in all_history:
-                            logger.info(f"Found job {comfyui_job_id} in general history")
-                            return {comfyui_job_id: all_history[comfyui_job_id]}
-                        else:
-                            logger.warning(f"Job {comfyui_job_id} not found in general history")
-                            return {}
+            async with _http_slots, session.get(url, params={"max_items": HISTORY_SCAN_ITEMS}, timeout=timeout) as response:
+                if response.status == 200:
+                    all_history = await self._loads(await response.read())
+                    
+                    # Look for our job in the history
+                    if comfyui_job_id in all_history:
+                        logger.info(f"Found job {comfyui_job_id} in general history")
+                        return {comfyui_job_id: all_history[comfyui_job_id]}
                     else:
+                        logger.warning(f"Job {comfyui_job_id} not found in general history")
                         return {}
-                        
+                else:
+                    return {}
+                    
         except Exception as e:
             logger.error(f"Failed to get result from general history: {e}")
             return {}
 
-    async def _check_if_cancelled(self, request_id: str) -> bool:
-        """Check if the job has been cancelled"""
-        try:
-            result = await self.response_store.get(request_id)
-            return result and getattr(result, 'status', '') == 'cancelled'
-        except Exception as e:
-            logger.warning(f"Error checking cancellation status for {request_id}: {e}")
-            return False
+    async def _forward_cancel(self, cancel_event: asyncio.Event, queue: asyncio.Queue):
+        """Wake the job's message loop once its request is cancelled"""
+        await cancel_event.wait()
+        queue.put_nowait(JOB_CANCELLED)
 
     async def cancel_comfyui_job(self, comfyui_job_id: str):
         """Cancel a running job in ComfyUI"""
@@ -528,28 +828,93 @@ class GenerationWorker:
                 "prompt_id": comfyui_job_id
             }
             
-            headers = {
-                'Content-Type': 'application/json'
-            }
-                
             timeout = aiohttp.ClientTimeout(total=5.0)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                cancel_url = COMFYUI_API_INTERRUPT
+            session = self._get_session()
+            cancel_url = COMFYUI_API_INTERRUPT
+                
+            async with _http_slots, session.post(
+                cancel_url,
+                data=orjson.dumps(payload),
+                headers=_JSON_HEADERS,
+                timeout=timeout
+            ) as response:
+                
+                if response.status == 200:
+                    logger.info(f"Successfully cancelled ComfyUI job {comfyui_job_id}")
+                    return True
+                else:
+                    response_text = await response.text()
+                    logger.warning(f"Failed to cancel ComfyUI job {comfyui_job_id}: HTTP {response.status} - {response_text}")
+                    return False
                 
-                async with session.post(
-                    cancel_url,
-                    data=json.dumps(payload),
-                    headers=headers
-                ) as response:
-                    
-                    if response.status == 200:
-                        logger.info(f"Successfully cancelled ComfyUI job {comfyui_job_id}")
-                        return True
-                    else:
-                        response_text = await response.text()
-                        logger.warning(f"Failed to cancel ComfyUI job {comfyui_job_id}: HTTP {response.status} - {response_text}")
-                        return False
-                    
         except Exception as e:
             logger.error(f"Error cancelling ComfyUI job {comfyui_job_id}: {e}")
             return False
+
+
+def _spool_if_large(path: Path, comfyui_response) -> Optional[int]:
+    """Write comfyui_response to path if its JSON exceeds SPOOL_RESPONSE_BYTES,
+    returning the bytes written (None if it was kept in the result)"""
+    try:
+        body = orjson.dumps(comfyui_response)
+    except TypeError:
+        return None
+    if len(body) <= SPOOL_RESPONSE_BYTES:
+        return None
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(body)
+    return len(body)
+
+
+def _input_file_names(workflow: Dict):
+    """Yield every string node input that could name a file in INPUT_DIR"""
+    for node in workflow.values():
+        inputs = node.get("inputs") if isinstance(node, dict) else None
+        if not isinstance(inputs, dict):
+            continue
+        for value in inputs.values():
+            if isinstance(value, str) and 0 < len(value) <= INPUT_NAME_MAX and "\n" not in value:
+                yield value
+
+
+def _saved_outputs(comfyui_response: Dict):
+    """Yield each saved (not temp/preview) output item in a ComfyUI response"""
+    for prompt_data in comfyui_response.values():
+        outputs = prompt_data.get("outputs") if isinstance(prompt_data, dict) else None
+        if not isinstance(outputs, dict):
+            continue
+        for node_outputs in outputs.values():
+            if not isinstance(node_outputs, dict):
+                continue
+            for output_list in node_outputs.values():
+                if not isinstance(output_list, list):
+                    continue
+                for item in output_list:
+                    if isinstance(item, dict) and 'filename' in item and item.get('type') not in ('temp', 'preview'):
+                        yield item
+
+
+def _reusable_response(comfyui_response) -> bool:
+    """Whether a ComfyUI response is a successful run that saved outputs"""
+    if not isinstance(comfyui_response, dict) or not comfyui_response:
+        return False
+    for prompt_data in comfyui_response.values():
+        if not isinstance(prompt_data, dict) or not prompt_data.get("outputs"):
+            return False
+        status = prompt_data.get("status")
+        if not isinstance(status, dict) or status.get("status_str") != "success":
+            return False
+    return any(True for _ in _saved_outputs(comfyui_response))
+
+
+def _outputs_exist(comfyui_response: Dict) -> bool:
+    """Whether every saved output of a response is still in OUTPUT_DIR"""
+    for item in _saved_outputs(comfyui_response):
+        # Same locations the postprocess worker looks in
+        subfolder = item.get('subfolder') or ''
+        if not (
+            (subfolder and os.path.exists(os.path.join(OUTPUT_DIR, subfolder, item['filename'])))
+            or os.path.exists(os.path.join(OUTPUT_DIR, item['filename']))
+        ):
+            return False
+    return True
@@ -1,21 +1,43 @@
 # postprocess_worker
 import asyncio
 import logging
-import os  # Still needed for symlink and remove operations
+import os
 import shutil
+import stat
 from pathlib import Path
-from typing import Dict, List, Optional
-import json
+from typing import Any, Dict, List, Optional
+from collections import OrderedDict
 
-import aiobotocore.session
 import aiofiles
 import aiofiles.os
 import aiohttp
+import orjson
 
-from config import OUTPUT_DIR, S3_CONFIG, S3_ENABLED, WEBHOOK_CONFIG, WEBHOOK_ENABLED
+from config import OUTPUT_DIR, S3_CONCURRENCY, S3_CONFIG, S3_ENABLED, WEBHOOK_BEFORE_UPLOAD, WEBHOOK_CONFIG, WEBHOOK_ENABLED
+from responses.result import SPOOLED_RESPONSE_NAME
 
 logger = logging.getLogger(__name__)
 
+# Files at least this large (bytes) go to S3 as a multipart upload, in parts of this size
+S3_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+S3_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+
+# Parts of one file read and uploading at once
+S3_MULTIPART_CONCURRENCY = 8
+
+# Output files linked into a job's directory at once
+OUTPUT_MOVE_CONCURRENCY = 8
+
+# Settings that identify a reusable S3 client; credentials included, so a
+# payload can never borrow a client authenticated with someone else's keys
+S3_CLIENT_KEY_FIELDS = (
+    "endpoint_url", "region", "access_key_id", "secret_access_key",
+    "connect_timeout", "connect_attempts", "max_pool_connections",
+)
+
+# S3 clients kept open per worker
+S3_CLIENT_CACHE_SIZE = 8
+
 
 class PostprocessWorker:
     """
@@ -28,12 +50,32 @@ class PostprocessWorker:
         self.postprocess_queue = kwargs["postprocess_queue"]
         self.request_store = kwargs["request_store"]
         self.response_store = kwargs["response_store"]
+        self.notify = kwargs["notify"]
         
         # Configuration
         self.output_dir = Path(OUTPUT_DIR)
 
+        # S3 clients reused across jobs, keyed by S3_CLIENT_KEY_FIELDS
+        self._s3_clients: "OrderedDict[tuple, Any]" = OrderedDict()
+        # Bounds how many output files are read and sent at once
+        self._upload_sem = asyncio.Semaphore(S3_CONCURRENCY)
+        # Webhook session, kept so repeat endpoints reuse their connections
+        self._http_session: Optional[aiohttp.ClientSession] = None
+
     async def work(self):
         logger.info(f"PostprocessWorker {self.worker_id}: waiting for jobs")
+        if S3_ENABLED:
+            # Build the environment's client up front rather than on the first upload
+            try:
+                s3_client = await self._get_s3_client(dict(S3_CONFIG))
+            except Exception as e:
+                logger.warning(f"Could not create S3 client: {e}")
+            else:
+                # Connecting is lazy too; open a pooled connection now
+                try:
+                    await s3_client.head_bucket(Bucket=S3_CONFIG["bucket_name"])
+                except Exception as e:
+                    logger.debug(f"S3 warm-up request failed: {e}")
         while True:
             # Get a task from the job queue
             request_id = await self.postprocess_queue.get()
@@ -43,6 +85,9 @@ class PostprocessWorker:
 
             # Process the job
             logger.info(f"PostprocessWorker {self.worker_id} processing job: {request_id}")
+            # Webhook already sent alongside the S3 upload (WEBHOOK_BEFORE_UPLOAD)
+            early_webhook = None
+            request = result = None
             
             try:
                 # Get request and result from stores
@@ -54,10 +99,14 @@ class PostprocessWorker:
                 if not result:
                     raise Exception(f"Result {request_id} not found in store")
                 
+                if not result.comfyui_response:
+                    await self.load_spooled_response(request_id, result)
+                
                 # Only process if we have ComfyUI output (successful generation)
                 if hasattr(result, 'comfyui_response') and result.comfyui_response:
                     logger.info(f"Processing outputs for {request_id}")
-                    logger.debug(f"ComfyUI response structure: {json.dumps(result.comfyui_response, indent=2)[:1000]}")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(f"ComfyUI response structure: {orjson.dumps(result.comfyui_response, option=orjson.OPT_INDENT_2).decode()[:1000]}")
                     
                     # Move generated assets to organized directory
                     await self.move_assets(request_id, result)
@@ -65,6 +114,11 @@ class PostprocessWorker:
                     # Handle S3 upload - check payload first, then environment variables
                     s3_config = await self.get_s3_config(request.input)
                     if s3_config:
+                        if WEBHOOK_BEFORE_UPLOAD:
+                            # Announce the outputs while they upload; the final webhook follows
+                            early_webhook = asyncio.create_task(
+                                self.notify_webhook(request_id, request, self._uploading_result(result))
+                            )
                         await self.upload_assets(request_id, s3_config, result)
                     else:
                         logger.info(f"No S3 configuration found for {request_id}, skipping upload")
@@ -81,38 +135,79 @@ class PostprocessWorker:
                     logger.info(f"Job {request_id} already marked as failed, keeping failure status")
                 
                 await self.response_store.set(request_id, result)
+                self.notify(request_id)
                 logger.info(f"PostprocessWorker {self.worker_id} completed job: {request_id}")
                 
             except Exception as e:
                 logger.error(f"PostprocessWorker {self.worker_id} failed job {request_id}: {e}")
                 
                 try:
-                    # Update result to show failure
-                    result = await self.response_store.get(request_id)
+                    # Update result to show failure; the copy loaded above is reused,
+                    # only re-reading the store if loading it is what failed
+                    if result is None:
+                        result = await self.response_store.get(request_id)
                     if result:
                         result.status = "failed"
                         result.message = f"Post-processing failed: {str(e)}"
                         await self.response_store.set(request_id, result)
+                        self.notify(request_id)
                     
                 except Exception as store_error:
                     logger.error(f"Failed to update result store for {request_id}: {store_error}")
             
             finally:
-                # Handle webhook - check payload first, then environment variables
-                webhook_config = await self.get_webhook_config(request.input)
-                if webhook_config:
-                    try:
-                        await self.send_webhook(webhook_config['url'], result, webhook_config.get('extra_params', {}))
-                    except Exception as webhook_error:
-                        # Will not mark a 'completed' job job as failed
-                        logger.error(f"Failed to run webhook for {request_id}: {webhook_error}")
-                else:
-                    logger.info(f"No webhook configuration found for {request_id}")
+                if early_webhook is not None:
+                    # Lets the final webhook (URLs, or the failure) arrive after it
+                    await early_webhook
+                await self.notify_webhook(request_id, request, result)
                 # Mark the job as complete
                 self.postprocess_queue.task_done()
             
+        await self.close_s3_clients()
+        if self._http_session is not None:
+            await self._http_session.close()
         logger.info(f"PostprocessWorker {self.worker_id} finished")
     
+    async def notify_webhook(self, request_id: str, request, result) -> None:
+        """Send the job's webhook, if one is configured"""
+        if request is None:
+            logger.warning(f"No request found for {request_id}, skipping webhook")
+            return
+        # Handle webhook - check payload first, then environment variables
+        webhook_config = await self.get_webhook_config(request.input)
+        if webhook_config:
+            try:
+                await self.send_webhook(webhook_config['url'], result, webhook_config.get('extra_params', {}))
+            except Exception as webhook_error:
+                # Will not mark a 'completed' job job as failed
+                logger.error(f"Failed to run webhook for {request_id}: {webhook_error}")
+        else:
+            logger.info(f"No webhook configuration found for {request_id}")
+
+    @staticmethod
+    def _uploading_result(result):
+        """Snapshot of result for a webhook sent before its uploads finish"""
+        # Shallow: only the output entries are copied, as uploads add their URLs in place
+        return result.model_copy(update={
+            "status": "uploading",
+            "message": "Outputs are uploading.",
+            "output": [dict(obj) for obj in result.output]
+        })
+
+    async def load_spooled_response(self, request_id: str, result) -> None:
+        """Bring back a comfyui_response the generation worker wrote to disk, if any"""
+        path = self.output_dir / request_id / SPOOLED_RESPONSE_NAME
+        try:
+            async with aiofiles.open(path, 'rb') as f:
+                body = await f.read()
+        except FileNotFoundError:
+            return
+        try:
+            result.comfyui_response = await asyncio.to_thread(orjson.loads, body)
+        finally:
+            # Read once; don't leave it beside the job's outputs
+            await self._remove_file_async(path)
+
     async def move_assets(self, request_id: str, result) -> None:
         """Move generated assets to organized directory structure"""
         try:
@@ -140,7 +235,8 @@ class PostprocessWorker:
             
             # Find the outputs in the response
             outputs = None
-            logger.info(result.comfyui_response)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"ComfyUI response: {result.comfyui_response}")
             
             # First, check if the response is wrapped with the prompt_id
             if isinstance(result.comfyui_response, dict):
@@ -158,42 +254,27 @@ class PostprocessWorker:
             
             if not outputs:
                 logger.warning(f"No outputs found in ComfyUI response for {request_id}")
-                logger.debug(f"Full response structure: {json.dumps(result.comfyui_response, indent=2)[:2000]}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Full response structure: {orjson.dumps(result.comfyui_response, option=orjson.OPT_INDENT_2).decode()[:2000]}")
                 return
             
-            # Process each node's outputs
-            processed_files = []
-            for node_id, node_outputs in outputs.items():
-                if not isinstance(node_outputs, dict):
-                    logger.debug(f"Skipping non-dict node output: {node_id}")
-                    continue
-                
-                logger.debug(f"Processing node {node_id} outputs: {list(node_outputs.keys())}")
-                
-                # Look for different output types (images, gifs, videos, etc.)
-                for output_type, output_list in node_outputs.items():
-                    if not isinstance(output_list, list):
-                        logger.debug(f"Skipping non-list output type {output_type} in node {node_id}")
-                        continue
-                    
-                    for item in output_list:
-                        if isinstance(item, dict) and 'filename' in item:
-                            # Skip preview/temp files
-                            file_type = item.get('type', '')
-                            if file_type in ['temp', 'preview']:
-                                logger.debug(f"Skipping {file_type} file: {item.get('filename')}")
-                                continue
-                            
-                            # Process this output file
-                            processed = await self._process_output_file(
-                                item, 
-                                job_output_dir, 
-                                request_id,
-                                node_id,
-                                output_type
-                            )
-                            if processed:
-                                processed_files.append(processed)
+            # Process every output file, a few at a time
+            slots = asyncio.Semaphore(OUTPUT_MOVE_CONCURRENCY)
+            
+            async def process(node_id, output_type, item):
+                async with slots:
+                    return await self._process_output_file(
+                        item, 
+                        job_output_dir, 
+                        request_id,
+                        node_id,
+                        output_type
+                    )
+            
+            processed = await asyncio.gather(
+                *(process(node_id, output_type, item) for node_id, output_type, item in _iter_outputs(outputs))
+            )
+            processed_files = [info for info in processed if info]
             
             # Add all processed files to the result
             result.output = processed_files
@@ -204,7 +285,7 @@ class PostprocessWorker:
             raise
 
     async def _process_output_file(self, item: Dict, job_output_dir: Path, request_id: str, node_id: str, output_type: str) -> Optional[Dict]:
-        """Process a single output file - copy to job directory and create symlink"""
+        """Process a single output file - link (or copy) it into the job directory"""
         try:
             filename = item.get('filename', '')
             subfolder = item.get('subfolder', '')
@@ -214,46 +295,18 @@ class PostprocessWorker:
                 logger.warning(f"No filename in output item: {item}")
                 return None
             
-            # Construct the original file path
-            # ComfyUI typically saves files in OUTPUT_DIR/subfolder/filename
-            if subfolder:
-                original_path = self.output_dir / subfolder / filename
-            else:
-                original_path = self.output_dir / filename
-            
-            # Check if the file exists
-            if not original_path.exists():
-                logger.warning(f"Original file not found: {original_path}")
-                # Try without subfolder as fallback
-                if subfolder:
-                    fallback_path = self.output_dir / filename
-                    if fallback_path.exists():
-                        logger.info(f"Found file at fallback location: {fallback_path}")
-                        original_path = fallback_path
-                    else:
-                        return None
-                else:
-                    return None
+            # ComfyUI typically saves files in OUTPUT_DIR/subfolder/filename;
+            # without a subfolder as fallback
+            candidates = [self.output_dir / subfolder / filename] if subfolder else []
+            candidates.append(self.output_dir / filename)
             
             # Destination path in job directory
             dest_path = job_output_dir / filename
             
-            # Get the real path (in case original_path is a symlink from a cached result)
-            real_original_path = original_path.resolve()
-            
-            logger.info(f"Copying {real_original_path} to {dest_path}")
-            
-            # Copy the file (using real path to handle symlinks)
-            await self._copy_file_async(real_original_path, dest_path)
-            
-            # Remove original file/symlink and create new symlink pointing to our copy
-            if original_path.exists() or original_path.is_symlink():
-                await self._remove_file_async(original_path)
-            
-            # Create symlink from original location to our copy
-            await self._create_symlink_async(dest_path, original_path)
-            
-            logger.debug(f"Created symlink: {original_path} -> {dest_path}")
+            # Every filesystem step for this file runs in one executor call
+            loop = asyncio.get_running_loop()
+            if not await loop.run_in_executor(None, _relocate_output, candidates, dest_path):
+                return None
             
             # Return file info for result
             return {
@@ -269,23 +322,10 @@ class PostprocessWorker:
             logger.error(f"Error processing output file {item}: {e}", exc_info=True)
             return None
 
-    async def _copy_file_async(self, src: Path, dst: Path) -> None:
-        """Async file copy"""
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, shutil.copy2, str(src), str(dst))
-
     async def _remove_file_async(self, path: Path) -> None:
         """Async file/symlink removal"""
-        loop = asyncio.get_running_loop()
-        if path.is_symlink():
-            await loop.run_in_executor(None, path.unlink)
-        else:
-            await loop.run_in_executor(None, os.remove, str(path))
-
-    async def _create_symlink_async(self, target: Path, link: Path) -> None:
-        """Async symlink creation - link points to target"""
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, os.symlink, str(target), str(link))
+        # unlink removes a symlink itself, never its target
+        await aiofiles.os.unlink(str(path))
 
     async def upload_assets(self, request_id: str, s3_config: Dict, result) -> None:
         """Upload assets to S3 storage"""
@@ -294,100 +334,204 @@ class PostprocessWorker:
             return
             
         try:
-            session = aiobotocore.session.get_session()
-            
-            # Build S3 client config
-            client_config = {
-                'aws_access_key_id': s3_config.get("access_key_id"),
-                'aws_secret_access_key': s3_config.get("secret_access_key"),
-            }
-            
-            if s3_config.get("endpoint_url"):
-                client_config['endpoint_url'] = s3_config["endpoint_url"]
+            s3_client = await self._get_s3_client(s3_config)
+            bucket_name = s3_config.get("bucket_name")
+            if not bucket_name:
+                raise ValueError("S3 bucket_name is required")
+            
+            # Upload all files concurrently
+            tasks = []
+            for obj in result.output:
+                local_path = obj.get("local_path")
+                if local_path:
+                    # move_assets saved the file under its ComfyUI filename
+                    s3_key = f"{request_id}/{obj.get('filename') or os.path.basename(local_path)}"
+                    task = asyncio.create_task(
+                        self.upload_file(s3_client, bucket_name, s3_key, local_path)
+                    )
+                    tasks.append(task)
+                else:
+                    logger.warning(f"Local file not found: {local_path}")
+                    tasks.append(asyncio.create_task(self._return_none()))
             
-            if s3_config.get("region"):
-                client_config['region_name'] = s3_config["region"]
+            # Wait for all uploads
+            if tasks:
+                s3_keys = await asyncio.gather(*tasks, return_exceptions=True)
                 
-            # Configure timeouts and retries
-            aio_config = aiobotocore.config.AioConfig(
-                connect_timeout=int(s3_config.get("connect_timeout", 60)),
-                retries={"max_attempts": int(s3_config.get("connect_attempts", 3))}
-            )
-            client_config['config'] = aio_config
-            
-            async with session.create_client('s3', **client_config) as s3_client:
-                bucket_name = s3_config.get("bucket_name")
-                if not bucket_name:
-                    raise ValueError("S3 bucket_name is required")
+                uploaded = []
+                for obj, key_result in zip(result.output, s3_keys):
+                    if isinstance(key_result, Exception):
+                        logger.error(f"Upload failed for {obj.get('local_path')}: {key_result}")
+                        obj["upload_error"] = str(key_result)
+                    elif key_result:
+                        uploaded.append((obj, key_result))
                 
-                # Upload all files concurrently
-                tasks = []
-                for obj in result.output:
-                    local_path = obj.get("local_path")
-                    if local_path and Path(local_path).exists():
-                        task = asyncio.create_task(
-                            self.upload_file_and_get_url(
-                                request_id, s3_client, bucket_name, local_path
-                            )
-                        )
-                        tasks.append(task)
+                # Sign every URL in one batch once the uploads are done; signing is
+                # local, so it shouldn't hold upload slots
+                presigned_urls = await asyncio.gather(
+                    *(self.get_presigned_url(s3_client, bucket_name, s3_key) for _, s3_key in uploaded),
+                    return_exceptions=True
+                )
+                
+                # Update result objects with URLs
+                for (obj, s3_key), url_result in zip(uploaded, presigned_urls):
+                    if isinstance(url_result, Exception):
+                        logger.error(f"Presigning failed for {s3_key}: {url_result}")
+                        obj["upload_error"] = str(url_result)
                     else:
-                        logger.warning(f"Local file not found: {local_path}")
-                        tasks.append(asyncio.create_task(self._return_none()))
+                        obj["url"] = url_result
+                        
+                logger.info(f"Uploaded {len(uploaded)} assets for {request_id}")
                 
-                # Wait for all uploads
-                if tasks:
-                    presigned_urls = await asyncio.gather(*tasks, return_exceptions=True)
-                    
-                    # Update result objects with URLs
-                    for obj, url_result in zip(result.output, presigned_urls):
-                        if isinstance(url_result, Exception):
-                            logger.error(f"Upload failed for {obj.get('local_path')}: {url_result}")
-                            obj["upload_error"] = str(url_result)
-                        elif url_result:
-                            obj["url"] = url_result
-                            
-                    logger.info(f"Uploaded {len([u for u in presigned_urls if u and not isinstance(u, Exception)])} assets for {request_id}")
-                    
         except Exception as e:
             logger.error(f"Error uploading assets for {request_id}: {e}")
             raise
 
+    async def _get_s3_client(self, s3_config: Dict):
+        """S3 client for these settings, created on first use and kept for later jobs"""
+        key = tuple(s3_config.get(name) for name in S3_CLIENT_KEY_FIELDS)
+        s3_client = self._s3_clients.get(key)
+        if s3_client is not None:
+            self._s3_clients.move_to_end(key)
+            return s3_client
+
+        # Imported on first use: botocore is heavy, and workers without S3 never need it
+        import aiobotocore.config
+        import aiobotocore.session
+        session = aiobotocore.session.get_session()
+        
+        # Build S3 client config
+        client_config = {
+            'aws_access_key_id': s3_config.get("access_key_id"),
+            'aws_secret_access_key': s3_config.get("secret_access_key"),
+        }
+        
+        if s3_config.get("endpoint_url"):
+            client_config['endpoint_url'] = s3_config["endpoint_url"]
+        
+        if s3_config.get("region"):
+            client_config['region_name'] = s3_config["region"]
+            
+        # Configure timeouts and retries
+        aio_config = aiobotocore.config.AioConfig(
+            connect_timeout=int(s3_config.get("connect_timeout", 60)),
+            retries={"max_attempts": int(s3_config.get("connect_attempts", 3))},
+            # Outputs upload concurrently, each multipart file with several parts in flight
+            max_pool_connections=int(s3_config.get("max_pool_connections", 32))
+        )
+        client_config['config'] = aio_config
+        
+        s3_client = await session.create_client('s3', **client_config).__aenter__()
+        self._s3_clients[key] = s3_client
+        # Payloads may bring their own credentials; don't hold a client for each forever
+        while len(self._s3_clients) > S3_CLIENT_CACHE_SIZE:
+            _, oldest = self._s3_clients.popitem(last=False)
+            await oldest.close()
+        return s3_client
+
+    async def close_s3_clients(self) -> None:
+        """Close every cached S3 client"""
+        while self._s3_clients:
+            _, s3_client = self._s3_clients.popitem()
+            try:
+                await s3_client.close()
+            except Exception as e:
+                logger.warning(f"Error closing S3 client: {e}")
+
     async def _return_none(self):
         """Helper for asyncio.gather with missing files"""
         return None
 
-    async def upload_file_and_get_url(self, request_id: str, s3_client, bucket_name: str, local_path: str) -> Optional[str]:
-        """Upload single file and return presigned URL"""
+    async def upload_file(self, s3_client, bucket_name: str, s3_key: str, local_path: str) -> Optional[str]:
+        """Upload single file and return its S3 key (None if the file is gone)"""
         try:
-            file_path = Path(local_path)
-            s3_key = f"{request_id}/{file_path.name}"
-            
             logger.debug(f"Uploading {s3_key} to bucket {bucket_name}")
 
-            # Upload file
-            async with aiofiles.open(local_path, 'rb') as file:
-                file_content = await file.read()
-                await s3_client.put_object(
-                    Bucket=bucket_name, 
-                    Key=s3_key, 
-                    Body=file_content
-                )
+            # Upload file; large ones in parts so they are never held in memory whole
+            async with self._upload_sem:
+                try:
+                    size = os.stat(local_path).st_size
+                except FileNotFoundError:
+                    logger.warning(f"Local file not found: {local_path}")
+                    return None
+                if size >= S3_MULTIPART_THRESHOLD:
+                    await self._multipart_upload(s3_client, bucket_name, s3_key, local_path)
+                else:
+                    async with aiofiles.open(local_path, 'rb') as file:
+                        file_content = await file.read()
+                    await s3_client.put_object(
+                        Bucket=bucket_name, 
+                        Key=s3_key, 
+                        Body=file_content
+                    )
 
-            # Generate presigned URL
-            presigned_url = await s3_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': bucket_name, 'Key': s3_key},
-                ExpiresIn=604800  # 7 days
-            )
-            
-            logger.debug(f"Generated presigned URL for {s3_key}")
-            return presigned_url
+            return s3_key
             
         except Exception as e:
             logger.error(f"Error uploading {local_path}: {e}")
             raise
 
+    async def get_presigned_url(self, s3_client, bucket_name: str, s3_key: str) -> str:
+        """Presigned GET URL for an uploaded object"""
+        presigned_url = await s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': bucket_name, 'Key': s3_key},
+            ExpiresIn=604800  # 7 days
+        )
+        logger.debug(f"Generated presigned URL for {s3_key}")
+        return presigned_url
+
+    async def _multipart_upload(self, s3_client, bucket_name: str, s3_key: str, local_path: str,
+                                part_size: int = S3_MULTIPART_CHUNKSIZE,
+                                concurrency: int = S3_MULTIPART_CONCURRENCY) -> None:
+        """Upload a file in parts, with at most `concurrency` parts in memory at a time"""
+        upload = await s3_client.create_multipart_upload(Bucket=bucket_name, Key=s3_key)
+        upload_id = upload["UploadId"]
+        slots = asyncio.Semaphore(concurrency)
+
+        async def send_part(part_number: int, chunk: bytes) -> Dict:
+            try:
+                response = await s3_client.upload_part(
+                    Bucket=bucket_name,
+                    Key=s3_key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=chunk
+                )
+            finally:
+                slots.release()
+            return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+        tasks = []
+        try:
+            # Reading the next part waits for a free slot, which bounds memory use
+            async with aiofiles.open(local_path, 'rb') as file:
+                part_number = 1
+                while True:
+                    await slots.acquire()
+                    chunk = await file.read(part_size)
+                    if not chunk:
+                        slots.release()
+                        break
+                    tasks.append(asyncio.create_task(send_part(part_number, chunk)))
+                    part_number += 1
+
+            parts = await asyncio.gather(*tasks)
+            await s3_client.complete_multipart_upload(
+                Bucket=bucket_name,
+                Key=s3_key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts}
+            )
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            try:
+                await s3_client.abort_multipart_upload(Bucket=bucket_name, Key=s3_key, UploadId=upload_id)
+            except Exception as abort_error:
+                logger.warning(f"Failed to abort multipart upload of {s3_key}: {abort_error}")
+            raise
+
     async def send_webhook(self, webhook_url: str, result, extra_params: Dict = None) -> None:
         """Send webhook notification with result"""
         try:
@@ -405,22 +549,31 @@ class PostprocessWorker:
             if extra_params:
                 webhook_data.update(extra_params)
             
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(
-                    webhook_url,
-                    json=webhook_data,
-                    headers={'Content-Type': 'application/json'}
-                ) as response:
-                    if response.status >= 400:
-                        error_text = await response.text()
-                        logger.warning(f"Webhook failed (status {response.status}): {error_text}")
-                    else:
-                        logger.info(f"Webhook sent successfully to {webhook_url}")
+            async with self._get_http_session().post(
+                webhook_url,
+                data=orjson.dumps(webhook_data, option=orjson.OPT_NON_STR_KEYS),
+                headers={'Content-Type': 'application/json'},
+                timeout=timeout
+            ) as response:
+                if response.status >= 400:
+                    error_text = await response.text()
+                    logger.warning(f"Webhook failed (status {response.status}): {error_text}")
+                else:
+                    logger.info(f"Webhook sent successfully to {webhook_url}")
                         
         except Exception as e:
             logger.error(f"Error sending webhook to {webhook_url}: {e}")
             # Don't raise - webhook failures shouldn't fail the whole job
 
+    def _get_http_session(self) -> aiohttp.ClientSession:
+        """Session shared by this worker's webhook calls"""
+        if self._http_session is None or self._http_session.closed:
+            self._http_session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=30),
+                connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300)
+            )
+        return self._http_session
+
     async def get_s3_config(self, input_data) -> Optional[Dict]:
         """Get S3 configuration from payload or centralized config (from environment)"""
         try:
@@ -433,7 +586,7 @@ class PostprocessWorker:
             # Fall back to centralized config (which reads from environment)
             if S3_ENABLED:
                 logger.info("Using S3 config from environment variables")
-                return S3_CONFIG.copy()  # Return a copy to avoid mutation
+                return dict(S3_CONFIG)  # Return a mutable copy
             
             # No valid config found
             logger.debug("No S3 configuration available")
@@ -460,9 +613,9 @@ class PostprocessWorker:
             if WEBHOOK_ENABLED:
                 logger.info("Using webhook config from environment variables")
                 return {
-                    'url': WEBHOOK_CONFIG['url'],
+                    'url': WEBHOOK_CONFIG.url,
                     'extra_params': {},
-                    'timeout': WEBHOOK_CONFIG['timeout']
+                    'timeout': WEBHOOK_CONFIG.timeout
                 }
             
             # No valid config found
@@ -471,4 +624,79 @@ class PostprocessWorker:
             
         except Exception as e:
             logger.error(f"Error getting webhook config: {e}")
-            return None
\ No newline at end of file
+            return None
+
+
+def _iter_outputs(outputs: Dict):
+    """Yield (node_id, output_type, item) for each saved file in a ComfyUI outputs dict"""
+    for node_id, node_outputs in outputs.items():
+        if not isinstance(node_outputs, dict):
+            continue
+        # Different output types (images, gifs, videos, etc.)
+        for output_type, output_list in node_outputs.items():
+            if not isinstance(output_list, list):
+                continue
+            for item in output_list:
+                # Skip preview/temp files
+                if isinstance(item, dict) and 'filename' in item and item.get('type') not in ('temp', 'preview'):
+                    yield node_id, output_type, item
+
+
+def _copy_file(src: Path, dst: Path) -> None:
+    """Copy src to dst with copy_file_range where available (a reflink on CoW
+    filesystems), falling back to shutil.copy2; metadata is kept either way"""
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if not copied:
+                        break
+                    remaining -= copied
+            if remaining <= 0:
+                shutil.copystat(src, dst)
+                return
+        except OSError as e:
+            # Kernel or filesystem without support (ENOSYS, EXDEV before 5.3, EINVAL)
+            logger.debug(f"copy_file_range {src} -> {dst} failed ({e}), using copy2")
+    shutil.copy2(src, dst)
+
+
+def _relocate_output(candidates: List[Path], dest_path: Path) -> bool:
+    """Move the first existing candidate into dest_path, keeping it reachable at its
+    original location; False if none exists"""
+    for original_path in candidates:
+        # One lstat answers both "does it exist" and "is it a symlink"
+        try:
+            is_symlink = stat.S_ISLNK(os.lstat(original_path).st_mode)
+            # Get the real path (in case original_path is a symlink from a cached result)
+            real_original_path = original_path.resolve(strict=True) if is_symlink else original_path
+            break
+        except FileNotFoundError:
+            logger.warning(f"Original file not found: {original_path}")
+    else:
+        return False
+    
+    logger.info(f"Linking {real_original_path} to {dest_path}")
+    
+    # Hardlink the file; both names then share the data, so the original
+    # needs no symlink back to our copy
+    try:
+        os.link(real_original_path, dest_path)
+        return True
+    except OSError as e:
+        # Different filesystem (EXDEV), no hardlink support, or dst already present
+        logger.debug(f"Hardlink {real_original_path} -> {dest_path} failed ({e}), copying")
+    _copy_file(real_original_path, dest_path)
+    
+    # A symlink already leads to live data (an earlier job's copy or a cache);
+    # leave it be rather than re-pointing it
+    if is_symlink:
+        return True
+    
+    # Replace the original file with a symlink pointing to our copy
+    original_path.unlink()
+    original_path.symlink_to(dest_path)
+    logger.debug(f"Created symlink: {original_path} -> {dest_path}")
+    return True
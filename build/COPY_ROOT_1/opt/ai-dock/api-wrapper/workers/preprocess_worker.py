@@ -1,11 +1,35 @@
 # preprocess_worker
+import functools
 import importlib
 import logging
+import pkgutil
+import modifiers
 from modifiers.basemodifier import BaseModifier
 
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=None)
+def _modifier_class(modifier_name: str) -> type:
+    """Modifier class modifier_name from modifiers.<modifier_name lowercased>"""
+    # Failed lookups raise and so are not cached; a later request retries them
+    module = importlib.import_module(f'modifiers.{modifier_name.lower()}')
+    return getattr(module, modifier_name)
+
+
+def _preload_modifiers() -> None:
+    """Import every modifier module now, so the first job using each skips it
+    and a broken one shows up at startup rather than on a request"""
+    for module_info in pkgutil.iter_modules(modifiers.__path__):
+        try:
+            importlib.import_module(f'modifiers.{module_info.name}')
+        except Exception as e:
+            logger.warning(f"Failed to preload modifier module '{module_info.name}': {e}")
+
+
+_preload_modifiers()
+
+
 class PreprocessWorker:
     """
     Check for URL's in the payload and download the assets as required
@@ -17,6 +41,7 @@ class PreprocessWorker:
         self.postprocess_queue = kwargs["postprocess_queue"]
         self.request_store = kwargs["request_store"]
         self.response_store = kwargs["response_store"]
+        self.notify = kwargs["notify"]
 
     async def work(self):
         logger.info(f"PreprocessWorker {self.worker_id}: waiting for jobs")
@@ -64,6 +89,7 @@ class PreprocessWorker:
                 result.status = "processing"
                 result.message = "Preprocessing complete. Queued for generation."
                 await self.response_store.set(request_id, result)
+                self.notify(request_id)
                 
                 # Send for ComfyUI generation
                 await self.generation_queue.put(request_id)
@@ -79,6 +105,7 @@ class PreprocessWorker:
                         result.status = "failed"
                         result.message = f"Preprocessing failed: {str(e)}"
                         await self.response_store.set(request_id, result)
+                        self.notify(request_id)
                     
                     # Send job straight to postprocess for cleanup
                     await self.postprocess_queue.put(request_id)
@@ -96,10 +123,8 @@ class PreprocessWorker:
         """Get the appropriate workflow modifier class"""
         try:
             if modifier_name:
-                # Dynamically import the modifier class
-                module_name = f'modifiers.{modifier_name.lower()}'
-                module = importlib.import_module(module_name)
-                modifier_class = getattr(module, modifier_name)
+                # Dynamically import the modifier class (once per name)
+                modifier_class = _modifier_class(modifier_name)
                 logger.info(f"Using modifier: {modifier_name}")
             else:
                 # Use base modifier if no specific modifier specified
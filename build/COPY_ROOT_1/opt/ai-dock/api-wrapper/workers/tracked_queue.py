@@ -0,0 +1,34 @@
+# tracked_queue
+import asyncio
+from typing import Dict, Tuple
+
+
+class TrackedQueue(asyncio.Queue):
+    """
+    FIFO queue that indexes each queued request_id for O(1) position lookups
+    """
+    def __init__(self, name: str, position_index: Dict[str, Tuple[str, int]], maxsize: int = 0):
+        super().__init__(maxsize)
+        self.name = name
+        # Shared across queues: request_id -> (queue name, sequence number)
+        self.position_index = position_index
+        self.head_seq = 0  # sequence number of the next item to be dequeued
+        self._tail_seq = 0
+
+    def position(self, seq: int) -> int:
+        """1-based position of the item with sequence number seq"""
+        return seq - self.head_seq + 1
+
+    def _put(self, item):
+        if item is not None:
+            self.position_index[item] = (self.name, self._tail_seq)
+        self._tail_seq += 1
+        super()._put(item)
+
+    def _get(self):
+        item = super()._get()
+        # Only drop the entry if it still refers to this slot (not a later re-queue)
+        if item is not None and self.position_index.get(item) == (self.name, self.head_seq):
+            del self.position_index[item]
+        self.head_seq += 1
+        return item
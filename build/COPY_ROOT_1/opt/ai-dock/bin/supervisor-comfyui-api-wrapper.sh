@@ -25,6 +25,8 @@ function start() {
     uvicorn main:app \
         --host 127.0.0.1 \
         --port $LISTEN_PORT \
+        --loop uvloop \
+        --http httptools \
         --reload
 }
 